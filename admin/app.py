@@ -14,13 +14,14 @@ from flask_security.core import RoleMixin, Security, UserMixin
 from flask_security.datastore import SQLAlchemyUserDatastore
 from flask_security.utils import hash_password
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect
+from sqlalchemy import func, inspect, select
 from wtforms import PasswordField
 
 from admin.views.users import UserView as AppUserView
 from bot.database.models import UserModel as AppUserModel
 
 if TYPE_CHECKING:
+    from sqlalchemy import Select
     from werkzeug.wrappers.response import Response
 
 # Create Flask application
@@ -122,13 +123,20 @@ def get_orders_count() -> int:
     return 0
 
 
+def read_count(query: Select) -> int:
+    """Run a count on the replica if there is one, the dashboard doesn't need the latest writes."""
+    bind = db.engines.get("replica", db.engine)
+    return db.session.execute(query, bind_arguments={"bind": bind}).scalar_one()
+
+
 def get_user_count() -> int:
-    return db.session.query(AppUserModel).count()
+    return read_count(select(func.count()).select_from(AppUserModel))
 
 
 def get_new_user_count(days_before: int = 1) -> int:
-    period_start = datetime.now(timezone.utc) - timedelta(days=days_before)
-    return db.session.query(AppUserModel).filter(AppUserModel.created_at >= period_start).count()
+    # created_at holds naive utc, comparing it with an aware datetime casts the column and skips its index
+    period_start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days_before)
+    return read_count(select(func.count()).where(AppUserModel.created_at >= period_start))
 
 
 class CustomAdminIndexView(AdminIndexView):
@@ -220,7 +228,7 @@ def init_db() -> None:
     if inspector.has_table("admin") and inspector.has_table("role"):
         return
 
-    db.create_all()
+    db.create_all(bind_key=None)
 
     admin_role = RoleModel(name="user", description="does not have access to other administrators")
     super_admin_role = RoleModel(name="superuser", description="has access to manage all administrators")
@@ -19,9 +19,9 @@ SECRET_KEY: str = os.getenv("SECRET_KEY") or "x%#3&%giwv8f0+%r946en7z&d@9*rc$sl0
 
 
 # SQLAlchemy config
-def database_url() -> str:
-    db_host: str = os.getenv("DB_HOST") or "localhost"
-    db_port: int = int(os.getenv("DB_PORT") or 5432)
+def database_url(db_host: str | None = None, db_port: int | None = None) -> str:
+    db_host = db_host or os.getenv("DB_HOST") or "localhost"
+    db_port = db_port or int(os.getenv("DB_PORT") or 5432)
     db_user: str = os.getenv("DB_USER") or "postgres"
     db_pass: str | None = os.getenv("DB_PASS")
     db_name: str = os.getenv("DB_NAME") or "postgres"
@@ -32,6 +32,12 @@ def database_url() -> str:
 
 
 SQLALCHEMY_DATABASE_URI: str = database_url()
+# dashboard counts are read from the replica when there is one
+SQLALCHEMY_BINDS: dict[str, str] = (
+    {"replica": database_url(os.getenv("DB_REPLICA_HOST"), int(os.getenv("DB_REPLICA_PORT") or 5432))}
+    if os.getenv("DB_REPLICA_HOST")
+    else {}
+)
 SQLALCHEMY_ECHO = False
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
@@ -1,9 +1,7 @@
-import datetime
-import json
-import random
 import secrets
-from typing import List, Dict, Annotated
+from typing import Annotated, Any
 
+import prometheus_client
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Body
 from sqlalchemy import select, update
@@ -11,11 +9,21 @@ from sqlalchemy.orm import Session
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.responses import JSONResponse
+from starlette.status import WS_1008_POLICY_VIOLATION
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
-from api.dependenciest import get_session
-from api.responseSchemas import UserDataResponse, GameBaseResponse, GameResponse, PlayingGameResponse, \
-    UserDataForGameResponse
+from api.actor import RoomActors, join_command, leave_command, message_command
+from api.connections import RoomConnections
+from api.dependenciest import get_read_session
+from api.engines import get_engine
+from api.history import MatchHistoryWriter
+from api.janitor import RoomJanitor
+from api.profiles import PlayerProfiles
+from api.protocol import PROTOCOL_PATCH, PROTOCOL_SNAPSHOT, PROTOCOLS, parse_resync
+from api.responseSchemas import UserDataResponse, GameBaseResponse, GameResponse, PlayingGameResponse
+from api.rooms import get_room_store
+from bot.cache.redis import start_invalidation_listener
+from bot.core.config import settings
 from bot.database.models import UserModel, GameModel
 
 app = FastAPI()
@@ -28,6 +36,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.mount("/metrics", prometheus_client.make_asgi_app())
+
 
 @app.get(
     "/user/{user_id}",
@@ -35,7 +45,7 @@ app.add_middleware(
 )
 async def get_user_data_endpoint(
         user_id: int,
-        db_session: Session = Depends(get_session)
+        db_session: Session = Depends(get_read_session)
 ):
     stmt = select(UserModel).where(UserModel.id == user_id).limit(1)
     query = await db_session.execute(stmt)
@@ -48,7 +58,7 @@ async def get_user_data_endpoint(
     response_model=list[GameBaseResponse],
 )
 async def get_games_endpoint(
-        db_session: Session = Depends(get_session)
+        db_session: Session = Depends(get_read_session)
 ):
     stmt = select(GameModel).order_by(GameModel.id)
     query = await db_session.execute(stmt)
@@ -62,7 +72,7 @@ async def get_games_endpoint(
 )
 async def get_games_endpoint(
         game_id: int,
-        db_session: Session = Depends(get_session)
+        db_session: Session = Depends(get_read_session)
 ):
     stmt = select(GameModel).where(GameModel.id == game_id).limit(1)
     query = await db_session.execute(stmt)
@@ -70,9 +80,17 @@ async def get_games_endpoint(
     return game
 
 
-rooms: Dict[str, PlayingGameResponse] = {}
+room_store = get_room_store()
+
+connections = RoomConnections(room_store)
+
+history = MatchHistoryWriter()
+
+actors = RoomActors(room_store, connections, history)
 
-websocket_lists: Dict[str, List[WebSocket]] = {}
+janitor = RoomJanitor(room_store, connections, actors)
+
+profiles = PlayerProfiles()
 
 
 @app.post(
@@ -82,7 +100,8 @@ async def get_games_endpoint(
         game_id: int = Body(...),
         bet: int = Body(...),
         count_players: int = Body(...),
-        db_session: Session = Depends(get_session)
+        game_settings: dict[str, Any] = Body({}, alias="settings"),
+        db_session: Session = Depends(get_read_session)
 ):
     def create_room_id(set_game_id: int):
         return f"{set_game_id}_{secrets.token_hex(5)}"
@@ -90,8 +109,9 @@ async def get_games_endpoint(
     stmt = select(GameModel).where(GameModel.id == game_id).limit(1)
     query = await db_session.execute(stmt)
     game: GameModel = query.scalar()
+    engine = get_engine(game_id)
     if not (
-            game and game.is_active and game.max_players
+            game and game.is_active and game.max_players and engine
     ):
         return JSONResponse({"error": "Game not found or not active"}, status_code=403)
 
@@ -104,24 +124,33 @@ async def get_games_endpoint(
     if count_players > game.max_players:
         return JSONResponse({"error": f"Number of players cannot be less than {game.max_players}"}, status_code=403)
 
+    if await room_store.count() >= settings.MAX_ROOMS:
+        return JSONResponse({"error": "Too many rooms, try again later"}, status_code=503)
+
     room_id = create_room_id(set_game_id=game.id)
-    rooms[room_id] = PlayingGameResponse(
+    room = PlayingGameResponse(
         title=game.title,
         game_id=game.id,
         description=game.description,
         websocket_uri=game.websocket_uri,
         bet=bet,
-        count_players=count_players
+        count_players=count_players,
+        settings=game_settings,
     )
-    print("created", rooms[room_id])
+    error = engine.validate_room(room)
+    if error:
+        return JSONResponse({"error": error}, status_code=403)
+
+    await room_store.save(room_id, room)
+    print("created", room)
 
     return JSONResponse({"redirect_to_room_uri": f"{game.front_uri}/{room_id}"}, status_code=200)
 
 
-def check_valid_room(room_id: str):
-    # print("all", rooms, rooms[room_id].game_id != room_id.split("_")[0])
-    if (room_id not in rooms or rooms[room_id].game_id != int(room_id.split("_")[0]) or
-            rooms[room_id].game_started or rooms[room_id].game_finished):
+async def check_valid_room(room_id: str):
+    room = await room_store.get(room_id)
+    if (room is None or room.game_id != int(room_id.split("_")[0]) or
+            room.game_started or room.game_finished):
         raise HTTPException(status_code=404, detail='not valid room')
 
 
@@ -132,222 +161,65 @@ def check_valid_room(room_id: str):
 async def get_room_info_endpoint(
         room_id: str
 ):
-    return rooms[room_id]
+    return await room_store.get(room_id)
 
 
-async def send_for_all_in_room(room_id: str, json: dict):
-    for player in websocket_lists[room_id]:
-        await player.send_json(json)
+@app.on_event("startup")
+async def start_background_tasks():
+    history.start()
+    janitor.start()
+    app.state.cache_listener = start_invalidation_listener()
 
 
-async def close_connections_all_in_room(room_id: str):
-    for player in websocket_lists[room_id]:
-        await player.close()
-    websocket_lists[room_id] = []
+@app.on_event("shutdown")
+async def stop_room_actors():
+    app.state.cache_listener.cancel()
+    await janitor.stop()
+    await actors.stop()
+    # after the actors, so the matches they finished while stopping are written too
+    await history.stop()
 
 
+@app.websocket("/ws/connect/{room_id}/{user_id}", dependencies=[Depends(check_valid_room)])
 @app.websocket("/ws/connect/ticktacktoe/{room_id}/{user_id}", dependencies=[Depends(check_valid_room)])
 async def connect_to_room_endpoint(
         room_id: str,
         user_id: int,
         websocket: WebSocket,
-        db_session: Session = Depends(get_session)
+        protocol: int = PROTOCOL_SNAPSHOT,
 ):
-    stmt = select(UserModel).where(UserModel.id == user_id).limit(1)
-    query = await db_session.execute(stmt)
-    user: UserModel = query.scalar()
-    if not user:
+    if protocol not in PROTOCOLS:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return None
+
+    # no session dependency here, it would stay checked out for the whole game
+    player = await profiles.get(user_id)
+    if player is None:
         return JSONResponse({"error": "User not found"}, status_code=400)
 
+    # the room actor owns the game, this coroutine only forwards what the player sends
     try:
         await websocket.accept()
-        # await websocket.send_json({"message": "Connected"})
-
-        if room_id not in websocket_lists:
-            websocket_lists[room_id] = [websocket]
-        else:
-            websocket_lists[room_id].append(websocket)
-
-        if user_id not in rooms[room_id].connected_players:
-            rooms[room_id].connected_players[user_id] = (
-                UserDataForGameResponse(
-                    avatar_url=user.avatar_url,
-                    last_name=user.last_name,
-                    first_name=user.first_name,
-                    username=user.username,
-                )
-            )
-            # await websocket.send_json({"message": "Waits other players"})
-        else:
-            rooms[room_id].connected_players[user_id].append(
-                UserDataForGameResponse(
-                    avatar_url=user.avatar_url,
-                    last_name=user.last_name,
-                    first_name=user.first_name,
-                    username=user.username,
-                )
-            )
-
-        await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-        while True:
-            ready = await websocket.receive_text()
-            if ready == "ready":
-                rooms[room_id].connected_players[user_id].is_ready = True
-                # await send_for_all_in_room(room_id, "User is ready")
-                await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-            elif ready == "not_ready":
-                rooms[room_id].connected_players[user_id].is_ready = False
-                # await send_for_all_in_room(room_id, "User is not ready")
-                await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-            if len(rooms[room_id].connected_players) == rooms[room_id].count_players:
-                all_players_ready = True
-                for connected_user in rooms[room_id].connected_players.values():
-                    if not connected_user.is_ready:
-                        all_players_ready = False
-                        break
-                if all_players_ready:
-                    rooms[room_id].game_started = True
-                    # await send_for_all_in_room(room_id, "Game started")
-                    await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-                    break
-        if rooms[room_id].current_player_id is None:
-            rooms[room_id].current_player_id = random.choice(
-                list(rooms[room_id].connected_players.keys()))
-
-        if rooms[room_id].game_progress is None:
-            rooms[room_id].game_progress = [[{"user_id": None, "checked_at": None} for _ in range(4)] for _ in range(4)]
-
-        await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-        def check_winner_3_in_a_row(board):
-            n = 4  # размер поля
-            win_len = 3  # длина серии для победы
-        
-            for x in range(n):
-                for y in range(n):
-                    player = board[x][y]["user_id"]
-                    if player is None:
-                        continue
-        
-                    # Проверяем горизонталь вправо
-                    if y + win_len - 1 < n:
-                        if all(board[x][y + offset]["user_id"] == player for offset in range(win_len)):
-                            return player
-        
-                    # Проверяем вертикаль вниз
-                    if x + win_len - 1 < n:
-                        if all(board[x + offset][y]["user_id"] == player for offset in range(win_len)):
-                            return player
-        
-                    # Проверяем диагональ вправо-вниз
-                    if x + win_len - 1 < n and y + win_len - 1 < n:
-                        if all(board[x + offset][y + offset]["user_id"] == player for offset in range(win_len)):
-                            return player
-        
-                    # Проверяем диагональ вправо-вверх
-                    if x - (win_len - 1) >= 0 and y + win_len - 1 < n:
-                        if all(board[x - offset][y + offset]["user_id"] == player for offset in range(win_len)):
-                            return player
-        
-            return None
+
+        if protocol == PROTOCOL_PATCH:
+            await connections.send_snapshot(websocket, await room_store.get(room_id))
+        await connections.connect(room_id, websocket, protocol)
+        await actors.submit(room_id, join_command(user_id, player))
 
         while True:
-            winner = check_winner_3_in_a_row(rooms[room_id].game_progress)
-            if winner is not None:
-                rooms[room_id].winner_id = winner
-                rooms[room_id].game_finished = True
-                break
-
-
-            board_full = True
-            for x in range(4):
-                for y in range(4):
-                    if rooms[room_id].game_progress[x][y]["user_id"] is None:
-                        board_full = False
-            if board_full:
-                rooms[room_id].game_finished = True
-                break
-
-            if rooms[room_id].game_finished:
-                break
-
-            move = await websocket.receive_text()
-            if rooms[room_id].current_player_id == user_id:
-                x, y = map(int, move.split(','))
-                if rooms[room_id].game_progress[x][y]["user_id"] is None:
-                    rooms[room_id].game_progress[x][y]["user_id"] = user_id
-                    rooms[room_id].game_progress[x][y]["checked_at"] = datetime.datetime.now().isoformat()
-
-                    rooms[room_id].current_player_id = list(rooms[room_id].connected_players.keys())[0]
-
-                    is_next_player = False
-                    for connected_user_id in rooms[room_id].connected_players.keys():
-                        if is_next_player:
-                            rooms[room_id].current_player_id = connected_user_id
-                            break
-                        if connected_user_id == user_id:
-                            is_next_player = True
-
-                    await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-
-        if rooms[room_id].winner_id == user_id is not None and rooms[room_id].game_finished:
-            stmt = select(UserModel).where(UserModel.id == user_id).limit(1)
-            query = await db_session.execute(stmt)
-            user: UserModel = query.scalar()
-            user.money = user.money + rooms[room_id].bet * 0.9
-            await db_session.commit()
-
-        if rooms[room_id].winner_id != user_id is not None and rooms[room_id].game_finished:
-            stmt = select(UserModel).where(UserModel.id == user_id).limit(1)
-            query = await db_session.execute(stmt)
-            user: UserModel = query.scalar()
-            user.money = user.money - rooms[room_id].bet
-            await db_session.commit()
-
-        await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-        await close_connections_all_in_room(room_id)
+            text = await websocket.receive_text()
+            version = parse_resync(text)
+            if version is None:
+                await actors.submit(room_id, message_command(user_id, text))
+                continue
+
+            room = await room_store.get(room_id)
+            if room is not None:
+                await connections.resync(room_id, websocket, room, version)
 
     except WebSocketDisconnect:
-        websocket_lists[room_id].remove(websocket)
-        await send_for_all_in_room(room_id, "Disconnected user")
-
-        if rooms[room_id].game_started and not (
-                rooms[room_id].game_finished):
-            stmt = select(UserModel).where(UserModel.id == user_id).limit(1)
-            query = await db_session.execute(stmt)
-            user: UserModel = query.scalar()
-            user.money = user.money - rooms[room_id].bet
-            await db_session.commit()
-
-        if len(rooms[room_id].connected_players) == 2 and rooms[room_id].game_started and not (
-                rooms[room_id].game_finished):
-            del rooms[room_id].connected_players[user_id]
-            rooms[room_id].winner_id = list(rooms[room_id].connected_players.keys())[0]
-            rooms[room_id].game_finished = True
-            stmt = select(UserModel).where(UserModel.id == rooms[room_id].winner_id).limit(1)
-            query = await db_session.execute(stmt)
-            user: UserModel = query.scalar()
-            user.money = user.money + rooms[room_id].bet * 0.9
-            await db_session.commit()
-            await close_connections_all_in_room(room_id)
-
-        elif rooms[room_id].game_started and not (
-                rooms[room_id].game_finished) and rooms[room_id].current_player_id == user_id:
-            rooms[room_id].current_player_id = list(rooms[room_id].connected_players.keys())[0]
-
-            is_next_player = False
-            for connected_user_id in rooms[room_id].connected_players.keys():
-                if is_next_player:
-                    rooms[room_id].current_player_id = connected_user_id
-                    break
-                if connected_user_id == user_id:
-                    is_next_player = True
-
-        del rooms[room_id].connected_players[user_id]
-
-        await send_for_all_in_room(room_id, rooms[room_id].model_dump())
-
-        # await send_for_all_in_room(room_id, "Game ended because user out "
-        #                                     "and last user is win")
+        await connections.disconnect(room_id, websocket)
+        await actors.submit(room_id, leave_command(user_id))
 
 
 if __name__ == "__main__":
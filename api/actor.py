@@ -0,0 +1,283 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import random
+import secrets
+import socket
+import time
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from cachetools import TTLCache
+from loguru import logger
+from redis.exceptions import RedisError
+
+from api.engines import InvalidMoveError
+from api.history import match_rows
+from api.protocol import make_patch
+from api.responseSchemas import UserDataForGameResponse
+from api.rooms import COMMANDS_CHANNEL
+from bot.core.config import settings
+from bot.database.database import sessionmaker
+from bot.services.users import settle_money
+
+if TYPE_CHECKING:
+    from api.connections import RoomConnections
+    from api.history import MatchHistoryWriter
+    from api.responseSchemas import PlayingGameResponse
+    from api.rooms import AbstractRoomStore
+
+OWNER_TTL = 30
+# the owner renews its claim this often, a room owned elsewhere is only claimed again after it
+CLAIM_INTERVAL = OWNER_TTL / 3
+REMOTE_OWNER_TTL = CLAIM_INTERVAL
+IDLE_TIMEOUT = 300
+STORE_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+
+def join_command(user_id: int, player: UserDataForGameResponse) -> dict[str, Any]:
+    return {"type": "join", "user_id": user_id, "player": player.model_dump()}
+
+
+def leave_command(user_id: int) -> dict[str, Any]:
+    return {"type": "leave", "user_id": user_id}
+
+
+def message_command(user_id: int, text: str) -> dict[str, Any]:
+    return {"type": "message", "user_id": user_id, "text": text}
+
+
+class RoomActor:
+    """The only task allowed to change a room.
+
+    Player commands are applied one by one from ``commands``; commands from players connected
+    to other workers arrive through the commands channel of the store.
+    """
+
+    def __init__(
+        self,
+        room_id: str,
+        store: AbstractRoomStore,
+        connections: RoomConnections,
+        history: MatchHistoryWriter,
+    ) -> None:
+        self.room_id = room_id
+        self.store = store
+        self.connections = connections
+        self.history = history
+        self.commands: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self.is_owner: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self.room: PlayingGameResponse | None = None
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        try:
+            # subscribe before claiming, so no command published by other workers after the claim is lost
+            async with self.store.subscribe(self.room_id, COMMANDS_CHANNEL) as remote_commands:
+                if not await self.store.claim(self.room_id, WORKER_ID, OWNER_TTL):
+                    return
+                self.is_owner.set_result(True)
+
+                receiver = asyncio.create_task(self._receive(remote_commands))
+                keeper = asyncio.create_task(self._keep_claim())
+                tasks = [receiver, keeper]
+                try:
+                    self.room = await self.store.get(self.room_id)
+                    tasks.append(asyncio.create_task(self._loop()))
+                    # the actor stops with the first of them: the game is over, the claim is lost or the channel failed
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await self.store.release(self.room_id, WORKER_ID)
+        finally:
+            if not self.is_owner.done():
+                self.is_owner.set_result(False)
+
+    async def _loop(self) -> None:
+        while self.room is not None and not self.room.game_finished:
+            try:
+                command = await asyncio.wait_for(self.commands.get(), timeout=IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if not self.room.connected_players:
+                    return
+                continue
+
+            try:
+                await self.handle(command)
+            except Exception:  # noqa: BLE001
+                logger.exception(f"room command failed | room_id: {self.room_id} | command: {command}")
+
+    async def _receive(self, remote_commands: Any) -> None:
+        """Queue the commands of players connected to other workers, return if the subscription fails."""
+        try:
+            async for message in remote_commands:
+                self.commands.put_nowait(orjson.loads(message))
+        except STORE_ERRORS:
+            logger.exception(f"room commands channel failed | room_id: {self.room_id}")
+
+    async def _keep_claim(self) -> None:
+        """Renew the claim on the room, return once it is lost or can't be renewed before it expires."""
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(CLAIM_INTERVAL)
+            try:
+                claimed = await asyncio.wait_for(self.store.claim(self.room_id, WORKER_ID, OWNER_TTL), CLAIM_INTERVAL)
+            except STORE_ERRORS:
+                logger.exception(f"room claim renewal failed | room_id: {self.room_id}")
+                # give up before the claim expires, from then on another worker may drive the room
+                if time.monotonic() - renewed >= OWNER_TTL - CLAIM_INTERVAL:
+                    return
+                continue
+
+            if not claimed:
+                logger.warning(f"room claim lost | room_id: {self.room_id}")
+                return
+            renewed = time.monotonic()
+
+    async def handle(self, command: dict[str, Any]) -> None:
+        room = self.room
+        user_id: int = command["user_id"]
+
+        if command["type"] == "join":
+            patch = self._join(room, user_id, UserDataForGameResponse.model_validate(command["player"]))
+        elif command["type"] == "leave":
+            patch = await self._leave(room, user_id)
+        elif room.game_started:
+            patch = self._move(room, user_id, command["text"])
+        else:
+            patch = self._ready(room, user_id, command["text"])
+
+        if patch is None:
+            return
+
+        ttl = settings.FINISHED_ROOM_TTL if room.game_finished else settings.ROOM_TTL
+        await self.store.save(self.room_id, room, ttl)
+        await self.connections.broadcast_change(self.room_id, room, patch)
+
+        if room.game_finished:
+            await self._finish(room)
+
+    def _join(self, room: PlayingGameResponse, user_id: int, player: UserDataForGameResponse) -> dict | None:
+        if room.game_started:
+            return None
+        if user_id in room.connected_players:
+            player.is_ready = room.connected_players[user_id].is_ready
+        room.connected_players[user_id] = player
+        return make_patch(room, "join", user_id=user_id, player=player)
+
+    def _ready(self, room: PlayingGameResponse, user_id: int, text: str) -> dict | None:
+        if text not in ("ready", "not_ready") or user_id not in room.connected_players:
+            return None
+
+        room.connected_players[user_id].is_ready = text == "ready"
+        if len(room.connected_players) < room.count_players or not all(
+            player.is_ready for player in room.connected_players.values()
+        ):
+            return make_patch(room, "ready", user_id=user_id, is_ready=text == "ready")
+
+        room.game_started = True
+        room.current_player_id = random.choice(list(room.connected_players.keys()))  # noqa: S311
+        room.engine.init_state()
+        return make_patch(room, "start", current_player_id=room.current_player_id, game_progress=room.game_progress)
+
+    def _move(self, room: PlayingGameResponse, user_id: int, text: str) -> dict | None:
+        if room.current_player_id != user_id:
+            return None
+        try:
+            changes = room.engine.apply_move(user_id, text)
+        except InvalidMoveError:
+            return None
+
+        return make_patch(
+            room,
+            "move",
+            user_id=user_id,
+            **changes,
+            current_player_id=room.current_player_id,
+            game_finished=room.game_finished,
+            winner_id=room.winner_id,
+        )
+
+    async def _leave(self, room: PlayingGameResponse, user_id: int) -> dict | None:
+        if user_id not in room.connected_players:
+            return None
+
+        await self.connections.broadcast(self.room_id, "Disconnected user")
+        if room.game_started and room.current_player_id == user_id:
+            room.current_player_id = room.engine.next_player(user_id)
+        del room.connected_players[user_id]
+
+        if room.game_started:
+            # leaving a started game loses the bet, the last player standing wins
+            await self._settle(f"{self.room_id}:leave:{user_id}", {user_id: -room.bet})
+            self.history.add(match_rows(self.room_id, room, [user_id], score=0.0))
+            if len(room.connected_players) == 1:
+                room.winner_id = next(iter(room.connected_players))
+                room.game_finished = True
+
+        return make_patch(
+            room,
+            "leave",
+            user_id=user_id,
+            current_player_id=room.current_player_id,
+            game_finished=room.game_finished,
+            winner_id=room.winner_id,
+        )
+
+    async def _finish(self, room: PlayingGameResponse) -> None:
+        await self._settle(f"{self.room_id}:finish", room.engine.settlement())
+        self.history.add(match_rows(self.room_id, room, list(room.connected_players)))
+        await self.connections.close_room(self.room_id)
+
+    async def _settle(self, settlement_id: str, deltas: dict[int, float]) -> None:
+        if not deltas:
+            return
+        async with sessionmaker() as session:
+            if not await settle_money(session, settlement_id, deltas):
+                logger.warning(f"settlement skipped | id: {settlement_id} | deltas: {deltas}")
+
+
+class RoomActors:
+    """Actors of the rooms owned by this worker."""
+
+    def __init__(self, store: AbstractRoomStore, connections: RoomConnections, history: MatchHistoryWriter) -> None:
+        self.store = store
+        self.connections = connections
+        self.history = history
+        self._actors: dict[str, RoomActor] = {}
+        # rooms another worker owns, their commands are published without trying to claim them on every move
+        self._remote_rooms: TTLCache[str, None] = TTLCache(maxsize=settings.MAX_ROOMS, ttl=REMOTE_OWNER_TTL)
+
+    async def submit(self, room_id: str, command: dict[str, Any]) -> None:
+        """Hand a player command to the actor of the room, wherever it runs."""
+        if room_id not in self._remote_rooms:
+            actor = self._actors.get(room_id)
+            if actor is None or actor.task.done():
+                actor = self._actors[room_id] = RoomActor(room_id, self.store, self.connections, self.history)
+                actor.task.add_done_callback(lambda _: self._forget(room_id, actor))
+
+            if await actor.is_owner:
+                actor.commands.put_nowait(command)
+                return
+            self._remote_rooms[room_id] = None
+
+        await self.store.publish(room_id, orjson.dumps(command), COMMANDS_CHANNEL)
+
+    def __len__(self) -> int:
+        return len(self._actors)
+
+    def _forget(self, room_id: str, actor: RoomActor) -> None:
+        if self._actors.get(room_id) is actor:
+            del self._actors[room_id]
+
+    async def stop(self) -> None:
+        for actor in list(self._actors.values()):
+            actor.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await actor.task
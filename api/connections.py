@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+from pydantic_core import to_json
+from starlette.websockets import WebSocketDisconnect
+
+from api.protocol import PROTOCOL_PATCH, PROTOCOL_SNAPSHOT, decode_change, encode_change, make_snapshot, resync_payloads
+
+if TYPE_CHECKING:
+    from starlette.websockets import WebSocket
+
+    from api.responseSchemas import PlayingGameResponse
+    from api.rooms import AbstractRoomStore
+
+CLOSE_MESSAGE = b"__close__"
+SEND_TIMEOUT = 2.0
+RESUBSCRIBE_DELAY = 1.0
+
+
+class RoomConnections:
+    """Websockets connected to this worker, fed from the room channel of the store.
+
+    Every broadcast goes through the store, so players of one room may be connected to different workers.
+    """
+
+    def __init__(self, store: AbstractRoomStore, send_timeout: float = SEND_TIMEOUT) -> None:
+        self.store = store
+        self.send_timeout = send_timeout
+        self._sockets: dict[str, dict[WebSocket, int]] = {}
+        self._listeners: dict[str, asyncio.Task] = {}
+
+    async def connect(self, room_id: str, websocket: WebSocket, protocol: int = PROTOCOL_SNAPSHOT) -> None:
+        self._sockets.setdefault(room_id, {})[websocket] = protocol
+        listener = self._listeners.get(room_id)
+        if listener is not None and not listener.done():
+            return
+
+        subscribed = asyncio.Event()
+        self._listeners[room_id] = asyncio.create_task(self._forward(room_id, subscribed))
+        await subscribed.wait()
+
+    async def disconnect(self, room_id: str, websocket: WebSocket) -> None:
+        sockets = self._sockets.get(room_id, {})
+        sockets.pop(websocket, None)
+        if not sockets:
+            await self._stop_listener(room_id)
+
+    def count(self) -> int:
+        """Number of websockets connected to this worker."""
+        return sum(len(sockets) for sockets in self._sockets.values())
+
+    async def prune(self) -> int:
+        """Stop listening to rooms whose sockets were all dropped, return how many were stopped."""
+        empty = [room_id for room_id in self._listeners if not self._sockets.get(room_id)]
+        for room_id in empty:
+            await self._stop_listener(room_id)
+        return len(empty)
+
+    async def broadcast(self, room_id: str, message: Any) -> None:
+        """Serialize the message once and publish it to every player of the room."""
+        await self.store.publish(room_id, to_json(message))
+
+    async def broadcast_change(self, room_id: str, room: PlayingGameResponse, patch: dict[str, Any]) -> None:
+        """Publish a room change, players get either the whole room or the patch depending on their protocol."""
+        await self.store.push_patch(room_id, to_json(patch))
+        await self.store.publish(room_id, encode_change(room, patch))
+
+    async def send_snapshot(self, websocket: WebSocket, room: PlayingGameResponse) -> None:
+        await websocket.send_text(to_json(make_snapshot(room)).decode())
+
+    async def resync(self, room_id: str, websocket: WebSocket, room: PlayingGameResponse, version: int) -> None:
+        """Replay the patches a client missed after ``version``, or send a snapshot if they are gone."""
+        patches = await self.store.get_patches(room_id)
+        for payload in resync_payloads(room, patches, version):
+            await websocket.send_text(payload.decode())
+
+    async def close_room(self, room_id: str) -> None:
+        await self.store.publish(room_id, CLOSE_MESSAGE)
+
+    async def _stop_listener(self, room_id: str) -> None:
+        self._sockets.pop(room_id, None)
+        listener = self._listeners.pop(room_id, None)
+        if listener is None or listener is asyncio.current_task():
+            return
+        listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await listener
+
+    async def _forward(self, room_id: str, subscribed: asyncio.Event) -> None:
+        """Forward the room channel to the sockets until the room is closed, subscribing again when it fails."""
+        while True:
+            try:
+                async with self.store.subscribe(room_id) as messages:
+                    subscribed.set()
+                    async for message in messages:
+                        if not await self._dispatch(room_id, message):
+                            return
+            except Exception:
+                logger.exception(f"room subscription failed | room_id: {room_id}")
+            # players that missed changes meanwhile ask for a resync when the next version does not follow theirs
+            subscribed.set()
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    async def _dispatch(self, room_id: str, message: bytes) -> bool:
+        """Send a message of the room channel to the sockets, return False once the room is closed."""
+        sockets = dict(self._sockets.get(room_id, {}))
+        if message == CLOSE_MESSAGE:
+            for websocket in sockets:
+                with contextlib.suppress(RuntimeError):
+                    await websocket.close()
+            self._sockets.pop(room_id, None)
+            self._listeners.pop(room_id, None)
+            return False
+
+        snapshot, patch = decode_change(message)
+        snapshot_text = snapshot.decode()
+        texts = {
+            PROTOCOL_SNAPSHOT: snapshot_text,
+            PROTOCOL_PATCH: snapshot_text if patch is snapshot else patch.decode(),
+        }
+        await asyncio.gather(
+            *(
+                self._send(room_id, websocket, texts.get(protocol, snapshot_text))
+                for websocket, protocol in sockets.items()
+            ),
+        )
+        return True
+
+    async def _send(self, room_id: str, websocket: WebSocket, text: str) -> None:
+        """Send with a deadline, a slow or broken consumer is dropped instead of stalling the room."""
+        try:
+            await asyncio.wait_for(websocket.send_text(text), timeout=self.send_timeout)
+        except (asyncio.TimeoutError, WebSocketDisconnect, RuntimeError, OSError) as e:
+            logger.warning(f"dropping websocket | room_id: {room_id} | reason: {type(e).__name__}")
+            self._sockets.get(room_id, {}).pop(websocket, None)
+            with contextlib.suppress(asyncio.TimeoutError, RuntimeError, OSError):
+                await asyncio.wait_for(websocket.close(), timeout=self.send_timeout)
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 
 from bot.database.database import sessionmaker
+from bot.database.replica import REPLICA_ERRORS, replica
 
 
 async def get_session() -> Session:
@@ -12,3 +13,18 @@ async def get_session() -> Session:
         raise
     finally:
         await session.close()
+
+
+async def get_read_session() -> Session:
+    """Session for read-only endpoints, on the replica while it is fresh enough."""
+    on_replica = await replica.is_fresh()
+    session = replica.session_factory() if on_replica else sessionmaker()
+    try:
+        yield session
+    except Exception as e:
+        if on_replica and isinstance(e, REPLICA_ERRORS):
+            replica.mark_failed()
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
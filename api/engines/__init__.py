@@ -0,0 +1,4 @@
+from .base import *
+from .tictactoe import *
+
+__all__ = ["AbstractGameEngine", "InvalidMoveError", "TicTacToeEngine", "get_engine", "register_engine"]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from bot.core.config import settings
+
+if TYPE_CHECKING:
+    from api.responseSchemas import PlayingGameResponse
+
+WINNER_SHARE = 0.9
+
+ENGINES: dict[str, type[AbstractGameEngine]] = {}
+
+
+class InvalidMoveError(Exception):
+    """The move is malformed or not allowed in the current state."""
+
+
+class AbstractGameEngine(ABC):
+    """Rules of one game, driving the state of a playing room."""
+
+    name: ClassVar[str]
+
+    def __init__(self, room: PlayingGameResponse) -> None:
+        self.room = room
+
+    @classmethod
+    def validate_room(cls, room: PlayingGameResponse) -> str | None:
+        """Return an error message if ``room.settings`` are not supported by the game.
+
+        Engines with settings also fill in the defaults of those missing.
+        """
+        return None
+
+    @abstractmethod
+    def init_state(self) -> None:
+        "Prepare ``room.game_progress`` when every player is ready."
+
+    @abstractmethod
+    def apply_move(self, user_id: int, move: str) -> dict[str, Any]:
+        """Validate and apply a move of the current player and return the fields of the patch describing it.
+
+        Raise InvalidMoveError if the move is not allowed.
+        """
+
+    def next_player(self, user_id: int) -> int:
+        """Player whose turn comes after ``user_id``, in order of joining."""
+        players = list(self.room.connected_players.keys())
+        if user_id not in players:
+            return players[0]
+        return players[(players.index(user_id) + 1) % len(players)]
+
+    def settlement(self) -> dict[int, float]:
+        """Money change of every player once the game is finished, a draw moves no money."""
+        winner_id = self.room.winner_id
+        if not self.room.game_finished or winner_id is None:
+            return {}
+
+        bet = self.room.bet
+        deltas = {user_id: -bet for user_id in self.room.connected_players if user_id != winner_id}
+        deltas[winner_id] = bet * WINNER_SHARE
+        return deltas
+
+
+def register_engine(engine: type[AbstractGameEngine]) -> type[AbstractGameEngine]:
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(game_id: int) -> type[AbstractGameEngine] | None:
+    """Engine of the game with this ``GameModel.id``, see the ``GAME_ENGINES`` setting."""
+    return ENGINES.get(settings.GAME_ENGINES.get(game_id, ""))
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, ValidationError
+
+from api.engines.base import AbstractGameEngine, InvalidMoveError, register_engine
+
+if TYPE_CHECKING:
+    from api.responseSchemas import PlayingGameResponse
+
+DEFAULT_BOARD_SIZE = 4
+DEFAULT_WIN_LENGTH = 3
+MAX_BOARD_SIZE = 19
+
+# right, down, down-right and up-right; the opposite halves are walked from the same cell
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1))
+
+
+class TicTacToeSettings(BaseModel):
+    board_size: int = DEFAULT_BOARD_SIZE
+    win_length: int = DEFAULT_WIN_LENGTH
+
+
+class TicTacToeBoard:
+    """N x N board where K marks in a row win.
+
+    Cells are kept in a flat list and only the lines through the last placed cell are checked,
+    so a move costs O(K) whatever the board size. ``progress`` is the board sent to clients,
+    it is updated in place together with the flat list.
+    """
+
+    def __init__(
+        self,
+        progress: list[list[dict[str, Any]]] | None = None,
+        size: int = DEFAULT_BOARD_SIZE,
+        win_length: int = DEFAULT_WIN_LENGTH,
+    ) -> None:
+        if progress is None:
+            progress = [[{"user_id": None, "checked_at": None} for _ in range(size)] for _ in range(size)]
+
+        self.size = len(progress)
+        self.win_length = win_length
+        self.progress = progress
+        self.cells: list[int | None] = [cell["user_id"] for row in progress for cell in row]
+        self.moves = sum(cell is not None for cell in self.cells)
+
+    @property
+    def is_full(self) -> bool:
+        return self.moves == self.size * self.size
+
+    def is_free(self, x: int, y: int) -> bool:
+        return 0 <= x < self.size and 0 <= y < self.size and self.cells[x * self.size + y] is None
+
+    def place(self, x: int, y: int, player: int, checked_at: str | None = None) -> int | None:
+        """Put the player's mark on a free cell and return the player if this move wins."""
+        self.cells[x * self.size + y] = player
+        self.progress[x][y]["user_id"] = player
+        self.progress[x][y]["checked_at"] = checked_at
+        self.moves += 1
+
+        for dx, dy in DIRECTIONS:
+            line = 1 + self._count(x, y, dx, dy, player) + self._count(x, y, -dx, -dy, player)
+            if line >= self.win_length:
+                return player
+        return None
+
+    def _count(self, x: int, y: int, dx: int, dy: int, player: int) -> int:
+        """Number of consecutive marks of the player from (x, y) in one direction, excluding the cell itself."""
+        count = 0
+        x, y = x + dx, y + dy
+        while count < self.win_length and 0 <= x < self.size and 0 <= y < self.size:
+            if self.cells[x * self.size + y] != player:
+                break
+            count += 1
+            x, y = x + dx, y + dy
+        return count
+
+
+@register_engine
+class TicTacToeEngine(AbstractGameEngine):
+    """Moves are ``"x,y"`` strings, the first line of ``win_length`` marks wins."""
+
+    name = "ticktacktoe"
+
+    def __init__(self, room: PlayingGameResponse) -> None:
+        super().__init__(room)
+        self.options = TicTacToeSettings.model_validate(room.settings)
+        self._board: TicTacToeBoard | None = None
+
+    @classmethod
+    def validate_room(cls, room: PlayingGameResponse) -> str | None:
+        try:
+            options = TicTacToeSettings.model_validate(room.settings)
+        except ValidationError:
+            return "Board size and win length must be integers"
+        if not 3 <= options.board_size <= MAX_BOARD_SIZE:
+            return f"Board size must be between 3 and {MAX_BOARD_SIZE}"
+        if not 3 <= options.win_length <= options.board_size:
+            return "Win length must be between 3 and the board size"
+        room.settings = options.model_dump()
+        return None
+
+    @property
+    def board(self) -> TicTacToeBoard:
+        if self._board is None or self._board.progress is not self.room.game_progress:
+            self._board = TicTacToeBoard(self.room.game_progress, self.options.board_size, self.options.win_length)
+            self.room.game_progress = self._board.progress
+        return self._board
+
+    def init_state(self) -> None:
+        self._board = TicTacToeBoard(size=self.options.board_size, win_length=self.options.win_length)
+        self.room.game_progress = self._board.progress
+
+    def apply_move(self, user_id: int, move: str) -> dict[str, Any]:
+        try:
+            x, y = map(int, move.split(","))
+        except ValueError:
+            raise InvalidMoveError(move) from None
+
+        board = self.board
+        if not board.is_free(x, y):
+            raise InvalidMoveError(move)
+
+        checked_at = datetime.now().isoformat()
+        winner = board.place(x, y, user_id, checked_at)
+        if winner is not None:
+            self.room.winner_id = winner
+            self.room.game_finished = True
+        elif board.is_full:
+            self.room.game_finished = True
+        else:
+            self.room.current_player_id = self.next_player(user_id)
+
+        return {"x": x, "y": y, "checked_at": checked_at}
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+from sqlalchemy import insert
+
+from bot.database.database import sessionmaker
+from bot.database.models import UserGameModel
+
+if TYPE_CHECKING:
+    from api.responseSchemas import PlayingGameResponse
+
+FLUSH_ROWS = 500
+FLUSH_INTERVAL = 1.0
+MAX_PENDING_ROWS = 50_000
+
+
+def match_rows(
+    room_id: str,
+    room: PlayingGameResponse,
+    user_ids: list[int],
+    score: float | None = None,
+) -> list[dict[str, Any]]:
+    """History rows of ``user_ids``, scored from the outcome of the room unless ``score`` is given."""
+    players = list(room.connected_players)
+    rows = []
+    for user_id in user_ids:
+        if score is None:
+            user_score = 0.5 if room.winner_id is None else float(room.winner_id == user_id)
+        else:
+            user_score = score
+        rows.append(
+            {
+                "user_id": user_id,
+                "game_id": room.game_id,
+                "room_id": room_id,
+                "score": user_score,
+                "bet": room.bet,
+                "opponents": [player_id for player_id in players if player_id != user_id],
+            },
+        )
+    return rows
+
+
+class MatchHistoryWriter:
+    """Buffers finished matches and inserts them into ``user_games`` in batches.
+
+    Rows are flushed every ``flush_rows`` rows or ``flush_interval`` seconds, whichever comes first,
+    so the game loop never waits for the database.
+    """
+
+    def __init__(
+        self,
+        flush_rows: int = FLUSH_ROWS,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_pending: int = MAX_PENDING_ROWS,
+    ) -> None:
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._rows: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=max_pending)
+        self._task: asyncio.Task | None = None
+
+    def add(self, rows: list[dict[str, Any]]) -> None:
+        for row in rows:
+            try:
+                self._rows.put_nowait(row)
+            except asyncio.QueueFull:
+                logger.warning(f"match history is full, row dropped | row: {row}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flushes and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        while not self._rows.empty():
+            await self._flush(self._take(self.flush_rows))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._rows.get()]
+            try:
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.flush_rows:
+                    batch.extend(self._take(self.flush_rows - len(batch)))
+                    timeout = deadline - loop.time()
+                    if len(batch) >= self.flush_rows or timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._rows.get(), timeout=timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # put back what was not committed, stop() writes it
+                self.add(batch)
+                raise
+
+    def _take(self, limit: int) -> list[dict[str, Any]]:
+        rows = []
+        while len(rows) < limit and not self._rows.empty():
+            rows.append(self._rows.get_nowait())
+        return rows
+
+    async def _flush(self, rows: list[dict[str, Any]]) -> None:
+        """Insert the rows and empty the list once they are committed."""
+        if not rows:
+            return
+        try:
+            async with sessionmaker() as session:
+                await session.execute(insert(UserGameModel), rows)
+                await session.commit()
+                # a cancellation while the session closes must not get them written twice
+                rows.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: BLE001
+            logger.exception(f"match history flush failed | rows: {len(rows)}")
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING
+
+import prometheus_client
+from loguru import logger
+
+if TYPE_CHECKING:
+    from api.actor import RoomActors
+    from api.connections import RoomConnections
+    from api.rooms import AbstractRoomStore
+
+METRICS_PREFIX = "game_api"
+JANITOR_INTERVAL = 30.0
+
+rooms_metric = prometheus_client.Gauge(f"{METRICS_PREFIX}_rooms", "Rooms kept by the room store")
+actors_metric = prometheus_client.Gauge(f"{METRICS_PREFIX}_room_actors", "Room actors running in this worker")
+websockets_metric = prometheus_client.Gauge(f"{METRICS_PREFIX}_websockets", "Websockets connected to this worker")
+expired_metric = prometheus_client.Counter(f"{METRICS_PREFIX}_rooms_expired", "Rooms dropped after their TTL")
+
+
+class RoomJanitor:
+    """Periodically drops expired rooms and idle listeners, and refreshes the room metrics.
+
+    Process memory is exported by the default process collector of ``prometheus_client``.
+    """
+
+    def __init__(
+        self,
+        store: AbstractRoomStore,
+        connections: RoomConnections,
+        actors: RoomActors,
+        interval: float = JANITOR_INTERVAL,
+    ) -> None:
+        self.store = store
+        self.connections = connections
+        self.actors = actors
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def sweep(self) -> None:
+        expired = await self.store.purge_expired()
+        pruned = await self.connections.prune()
+        if expired or pruned:
+            logger.info(f"rooms swept | expired: {expired} | idle listeners: {pruned}")
+
+        expired_metric.inc(expired)
+        rooms_metric.set(await self.store.count())
+        actors_metric.set(len(self.actors))
+        websockets_metric.set(self.connections.count())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:  # noqa: BLE001
+                logger.exception("rooms sweep failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from cachetools import TTLCache
+
+from api.responseSchemas import UserDataForGameResponse
+from bot.database.database import sessionmaker
+from bot.services.users import get_player_profile
+
+PROFILE_CACHE_SIZE = 10_000
+PROFILE_CACHE_TTL = 30
+
+
+class PlayerProfiles:
+    """Read-through cache of the player profiles shown in game rooms.
+
+    A small local cache absorbs reconnect storms, behind it the Redis cache of ``get_player_profile``
+    is shared with the bot, which clears it when a user changes.
+    """
+
+    def __init__(self, maxsize: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL) -> None:
+        self._profiles: TTLCache[int, dict[str, str | None]] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, user_id: int) -> UserDataForGameResponse | None:
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            # the session only checks out a connection if the profile is not cached in Redis either
+            async with sessionmaker() as session:
+                profile = await get_player_profile(session, user_id)
+            if profile is None:
+                return None
+            self._profiles[user_id] = profile
+
+        # a new model every time, players of different rooms must not share the ready flag
+        return UserDataForGameResponse(**profile)
@@ -0,0 +1,68 @@
+"""Wire protocols of the game websocket.
+
+Version 1 sends the whole room after every change.
+Version 2 sends a snapshot on join and then versioned patches, a client that missed
+a patch asks for ``{"type": "resync", "version": <last applied version>}``.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from pydantic_core import to_json
+
+if TYPE_CHECKING:
+    from api.responseSchemas import PlayingGameResponse
+
+PROTOCOL_SNAPSHOT = 1
+PROTOCOL_PATCH = 2
+PROTOCOLS = (PROTOCOL_SNAPSHOT, PROTOCOL_PATCH)
+PATCH_LOG_SIZE = 64
+
+_SEPARATOR = b"\n"  # never present in compact JSON
+
+
+def make_patch(room: PlayingGameResponse, op: str, **changes: Any) -> dict[str, Any]:
+    """Bump the room version and describe the change that produced it."""
+    room.version += 1
+    return {"type": "patch", "version": room.version, "op": op, **changes}
+
+
+def make_snapshot(room: PlayingGameResponse) -> dict[str, Any]:
+    return {"type": "snapshot", "version": room.version, "room": room}
+
+
+def encode_change(room: PlayingGameResponse, patch: dict[str, Any]) -> bytes:
+    """Pack the full room (protocol 1) and the patch (protocol 2) into one published message."""
+    return to_json(room) + _SEPARATOR + to_json(patch)
+
+
+def decode_change(message: bytes) -> tuple[bytes, bytes]:
+    """Split a published message into protocol 1 and protocol 2 payloads."""
+    snapshot, _, patch = message.partition(_SEPARATOR)
+    return snapshot, patch or snapshot
+
+
+def parse_resync(text: str) -> int | None:
+    """Return the client version of a resync request or None if the text is not one."""
+    if not text.startswith("{"):
+        return None
+    try:
+        request = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(request, dict) or request.get("type") != "resync":
+        return None
+    version = request.get("version")
+    return version if isinstance(version, int) else 0
+
+
+def resync_payloads(room: PlayingGameResponse, patches: list[bytes], version: int) -> list[bytes]:
+    """Patches the client missed since ``version`` or a fresh snapshot if the log no longer covers them."""
+    if version >= room.version:
+        return []
+
+    missed = [(orjson.loads(patch)["version"], patch) for patch in patches]
+    missed = [(patch_version, patch) for patch_version, patch in missed if patch_version > version]
+    if not missed or missed[0][0] != version + 1:
+        return [to_json(make_snapshot(room))]
+    return [patch for _, patch in missed]
@@ -1,6 +1,8 @@
 from typing import Dict, Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from api.engines import AbstractGameEngine, get_engine
 
 
 class UserDataResponse(BaseModel):
@@ -43,3 +45,15 @@ class PlayingGameResponse(BaseModel):
     game_progress: Any = Field(None)
     game_finished: bool = Field(False)
     winner_id: int | None = Field(None)
+    version: int = Field(0)
+    # options of the game, checked by the engine
+    settings: Dict[str, Any] = Field({})
+
+    _engine: AbstractGameEngine | None = PrivateAttr(None)
+
+    @property
+    def engine(self) -> AbstractGameEngine:
+        """Engine of the game, created again when the room was loaded from a store."""
+        if self._engine is None:
+            self._engine = get_engine(self.game_id)(self)
+        return self._engine
@@ -0,0 +1,244 @@
+from __future__ import annotations
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+from api.protocol import PATCH_LOG_SIZE
+from api.responseSchemas import PlayingGameResponse
+from bot.core.config import settings
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from contextlib import AbstractAsyncContextManager
+
+    from redis.asyncio import Redis
+
+ROOM_KEY_PREFIX = "room"
+ROOM_INDEX_KEY = "rooms"  # sorted set of room ids scored by expiration time
+
+EVENTS_CHANNEL = "events"  # room changes for the players
+COMMANDS_CHANNEL = "commands"  # player commands for the worker owning the room
+
+CLAIM_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then return 1 end
+if redis.call('get', KEYS[1]) == ARGV[1] then redis.call('expire', KEYS[1], ARGV[2]) return 1 end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+class AbstractRoomStore(ABC):
+    """Storage of playing rooms plus per-room channels for fan-out between workers."""
+
+    @abstractmethod
+    async def get(self, room_id: str) -> PlayingGameResponse | None:
+        "Return the room state or None if the room does not exist."
+
+    @abstractmethod
+    async def save(self, room_id: str, room: PlayingGameResponse, ttl: int = settings.ROOM_TTL) -> None:
+        "Create or replace the room state, the room expires if it is not saved again within ``ttl`` seconds."
+
+    @abstractmethod
+    async def delete(self, room_id: str) -> None:
+        "Drop the room state."
+
+    @abstractmethod
+    async def count(self) -> int:
+        "Return the number of rooms that are not expired."
+
+    @abstractmethod
+    async def purge_expired(self) -> int:
+        "Drop what is left of expired rooms and return how many there were."
+
+    @abstractmethod
+    async def claim(self, room_id: str, owner: str, ttl: int) -> bool:
+        "Become (or stay) the only worker driving the room for ``ttl`` seconds."
+
+    @abstractmethod
+    async def release(self, room_id: str, owner: str) -> None:
+        "Give up the room if it is still owned by ``owner``."
+
+    @abstractmethod
+    async def publish(self, room_id: str, message: bytes, channel: str = EVENTS_CHANNEL) -> None:
+        "Send a message to every subscriber of the room channel, in any worker."
+
+    @abstractmethod
+    def subscribe(
+        self, room_id: str, channel: str = EVENTS_CHANNEL
+    ) -> AbstractAsyncContextManager[AsyncIterator[bytes]]:
+        "Subscribe to the room channel; the subscription is active once entered."
+
+    @abstractmethod
+    async def push_patch(self, room_id: str, patch: bytes) -> None:
+        "Remember a patch of the delta protocol, only the last PATCH_LOG_SIZE are kept."
+
+    @abstractmethod
+    async def get_patches(self, room_id: str) -> list[bytes]:
+        "Return the remembered patches, oldest first."
+
+
+class MemoryRoomStore(AbstractRoomStore):
+    """Process-local store, only valid when the API runs in a single worker."""
+
+    def __init__(self) -> None:
+        self._rooms: dict[str, PlayingGameResponse] = {}
+        self._expires: dict[str, float] = {}
+        self._owners: dict[str, str] = {}
+        self._subscribers: dict[tuple[str, str], set[asyncio.Queue[bytes]]] = {}
+        self._patches: dict[str, deque[bytes]] = {}
+
+    async def get(self, room_id: str) -> PlayingGameResponse | None:
+        if self._expires.get(room_id, float("inf")) <= time.monotonic():
+            await self.delete(room_id)
+        return self._rooms.get(room_id)
+
+    async def save(self, room_id: str, room: PlayingGameResponse, ttl: int = settings.ROOM_TTL) -> None:
+        self._rooms[room_id] = room
+        self._expires[room_id] = time.monotonic() + ttl
+
+    async def delete(self, room_id: str) -> None:
+        self._rooms.pop(room_id, None)
+        self._expires.pop(room_id, None)
+        self._patches.pop(room_id, None)
+
+    async def count(self) -> int:
+        await self.purge_expired()
+        return len(self._rooms)
+
+    async def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [room_id for room_id, expires in self._expires.items() if expires <= now]
+        for room_id in expired:
+            await self.delete(room_id)
+        return len(expired)
+
+    async def claim(self, room_id: str, owner: str, ttl: int) -> bool:  # noqa: ARG002
+        return self._owners.setdefault(room_id, owner) == owner
+
+    async def release(self, room_id: str, owner: str) -> None:
+        if self._owners.get(room_id) == owner:
+            del self._owners[room_id]
+
+    async def publish(self, room_id: str, message: bytes, channel: str = EVENTS_CHANNEL) -> None:
+        for queue in self._subscribers.get((room_id, channel), ()):
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, room_id: str, channel: str = EVENTS_CHANNEL) -> AsyncIterator[AsyncIterator[bytes]]:
+        queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self._subscribers.setdefault((room_id, channel), set()).add(queue)
+
+        async def messages() -> AsyncIterator[bytes]:
+            while True:
+                yield await queue.get()
+
+        try:
+            yield messages()
+        finally:
+            subscribers = self._subscribers.get((room_id, channel), set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop((room_id, channel), None)
+
+    async def push_patch(self, room_id: str, patch: bytes) -> None:
+        self._patches.setdefault(room_id, deque(maxlen=PATCH_LOG_SIZE)).append(patch)
+
+    async def get_patches(self, room_id: str) -> list[bytes]:
+        return list(self._patches.get(room_id, ()))
+
+
+class RedisRoomStore(AbstractRoomStore):
+    """Rooms are kept as JSON in Redis and messages are fanned out with Redis pub/sub."""
+
+    def __init__(self, redis: Redis, pubsub_redis: Redis | None = None) -> None:
+        self.redis = redis
+        # subscriptions wait for messages indefinitely, give them a client without a read timeout
+        self.pubsub_redis = pubsub_redis or redis
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+
+    @staticmethod
+    def _key(room_id: str, *parts: str) -> str:
+        return ":".join((ROOM_KEY_PREFIX, room_id, *parts))
+
+    async def get(self, room_id: str) -> PlayingGameResponse | None:
+        value = await self.redis.get(self._key(room_id))
+        if value is None:
+            return None
+        return PlayingGameResponse.model_validate_json(value)
+
+    async def save(self, room_id: str, room: PlayingGameResponse, ttl: int = settings.ROOM_TTL) -> None:
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.set(self._key(room_id), room.model_dump_json(), ex=ttl)
+            pipeline.expire(self._key(room_id, "patches"), ttl)
+            pipeline.zadd(ROOM_INDEX_KEY, {room_id: time.time() + ttl})
+            await pipeline.execute()
+
+    async def delete(self, room_id: str) -> None:
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.delete(self._key(room_id), self._key(room_id, "patches"))
+            pipeline.zrem(ROOM_INDEX_KEY, room_id)
+            await pipeline.execute()
+
+    async def count(self) -> int:
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.zremrangebyscore(ROOM_INDEX_KEY, "-inf", time.time())
+            pipeline.zcard(ROOM_INDEX_KEY)
+            _, count = await pipeline.execute()
+        return count
+
+    async def purge_expired(self) -> int:
+        # the room keys expire by themselves, only the index has to be cleaned
+        return await self.redis.zremrangebyscore(ROOM_INDEX_KEY, "-inf", time.time())
+
+    async def claim(self, room_id: str, owner: str, ttl: int) -> bool:
+        return bool(await self._claim(keys=[self._key(room_id, "owner")], args=[owner, ttl]))
+
+    async def release(self, room_id: str, owner: str) -> None:
+        await self._release(keys=[self._key(room_id, "owner")], args=[owner])
+
+    async def publish(self, room_id: str, message: bytes, channel: str = EVENTS_CHANNEL) -> None:
+        await self.redis.publish(self._key(room_id, channel), message)
+
+    @asynccontextmanager
+    async def subscribe(self, room_id: str, channel: str = EVENTS_CHANNEL) -> AsyncIterator[AsyncIterator[bytes]]:
+        channel = self._key(room_id, channel)
+        pubsub = self.pubsub_redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+
+        async def messages() -> AsyncIterator[bytes]:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+
+        try:
+            yield messages()
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+    async def push_patch(self, room_id: str, patch: bytes) -> None:
+        key = self._key(room_id, "patches")
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.rpush(key, patch)
+            pipeline.ltrim(key, -PATCH_LOG_SIZE, -1)
+            pipeline.expire(key, settings.ROOM_TTL, nx=True)  # the first patch creates the key after save()
+            await pipeline.execute()
+
+    async def get_patches(self, room_id: str) -> list[bytes]:
+        return await self.redis.lrange(self._key(room_id, "patches"), 0, -1)
+
+
+def get_room_store(backend: str = settings.ROOM_STORE) -> AbstractRoomStore:
+    if backend == "redis":
+        from bot.core.loader import pubsub_redis_client, redis_client
+
+        return RedisRoomStore(redis_client, pubsub_redis_client)
+    return MemoryRoomStore()
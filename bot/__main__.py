@@ -7,6 +7,7 @@ import uvloop
 from loguru import logger
 from sentry_sdk.integrations.loguru import LoggingLevels, LoguruIntegration
 
+from bot.cache.redis import start_invalidation_listener
 from bot.core.config import settings
 from bot.core.loader import app, bot, dp
 from bot.handlers import get_handlers_router
@@ -25,6 +26,8 @@ async def on_startup() -> None:
 
     register_middlewares(dp)
 
+    dp["cache_listener"] = start_invalidation_listener()
+
     dp.include_router(get_handlers_router())
 
     if settings.USE_WEBHOOK:
@@ -55,6 +58,8 @@ async def on_startup() -> None:
 async def on_shutdown() -> None:
     logger.info("bot stopping...")
 
+    dp["cache_listener"].cancel()
+
     await remove_default_commands(bot)
 
     await dp.storage.close()
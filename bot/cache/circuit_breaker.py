@@ -0,0 +1,45 @@
+from __future__ import annotations
+import time
+
+
+class CircuitBreaker:
+    """Stops calling a failing backend for a while.
+
+    After ``failure_threshold`` failures in a row the circuit opens and ``allow`` returns False
+    for ``reset_timeout`` seconds, then a single trial call is let through (half-open):
+    its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._trial = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self) -> None:
+        """Give back a trial that ended without an outcome (e.g. cancelled), so the next call can try again."""
+        self._trial = False
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+import prometheus_client
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+METRICS_PREFIX = "tgbot_cache"
+
+hits_metrics = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_hits",
+    documentation="Cached values served, by namespace, function and tier (local or redis).",
+    labelnames=["namespace", "function", "tier"],
+)
+misses_metrics = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_misses",
+    documentation="Values computed because they were not cached, by namespace and function.",
+    labelnames=["namespace", "function"],
+)
+errors_metrics = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_errors",
+    documentation="Failed Redis commands and computations, by namespace, function and operation.",
+    labelnames=["namespace", "function", "operation"],
+)
+payload_bytes_metrics = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_payload_bytes",
+    documentation="Bytes of cached values read from and written to Redis, by namespace, function and direction.",
+    labelnames=["namespace", "function", "direction"],
+)
+redis_duration_metrics = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_redis_duration",
+    documentation="Duration of the Redis commands of the cache, by namespace, function and command.",
+    labelnames=["namespace", "function", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+compute_duration_metrics = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_compute_duration",
+    documentation="Duration of the cached functions on a miss, by namespace and function.",
+    labelnames=["namespace", "function"],
+)
+
+
+class CacheMetrics:
+    """Metrics of one cached function, label children are resolved once."""
+
+    def __init__(self, namespace: str, function: str) -> None:
+        self.labels = (namespace, function)
+        self.local_hits = hits_metrics.labels(namespace, function, "local")
+        self.redis_hits = hits_metrics.labels(namespace, function, "redis")
+        self.misses = misses_metrics.labels(namespace, function)
+        self.bytes_read = payload_bytes_metrics.labels(namespace, function, "read")
+        self.bytes_written = payload_bytes_metrics.labels(namespace, function, "write")
+        self.compute_duration = compute_duration_metrics.labels(namespace, function)
+
+    @contextmanager
+    def redis(self, command: str) -> Iterator[None]:
+        """Time a Redis command and count it as an error if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            errors_metrics.labels(*self.labels, command).inc()
+            raise
+        finally:
+            redis_duration_metrics.labels(*self.labels, command).observe(time.perf_counter() - started)
+
+    @contextmanager
+    def compute(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            errors_metrics.labels(*self.labels, "compute").inc()
+            raise
+        finally:
+            self.compute_duration.observe(time.perf_counter() - started)
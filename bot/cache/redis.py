@@ -1,18 +1,75 @@
 from __future__ import annotations
+import asyncio
+import contextlib
+import math
+import random
+import secrets
+import struct
+import time
+from datetime import timedelta
 from functools import wraps
 from typing import TYPE_CHECKING
 
+from cachetools import TLRUCache
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.cache.circuit_breaker import CircuitBreaker
+from bot.cache.metrics import CacheMetrics
 from bot.cache.serialization import AbstractSerializer, PickleSerializer
-from bot.core.loader import redis_client
+from bot.core.config import settings
+from bot.core.loader import pubsub_redis_client, redis_client
+from bot.database.database import LazySession, sessionmaker
 
 if TYPE_CHECKING:
-    from datetime import timedelta
-    from typing import Any, Callable
+    from typing import Any, Awaitable, Callable, Coroutine, Iterable, TypeVar
 
     from redis.asyncio import Redis
+    from redis.asyncio.client import Pipeline
 
+    T = TypeVar("T")
 
 DEFAULT_TTL = 10
+DEFAULT_STALE_TTL = 30
+LOCAL_TTL = 5
+LOCAL_CACHE_SIZE = 10_000
+INVALIDATION_CHANNEL = "cache:invalidate"
+LOCK_POLL_INTERVAL = 0.05
+ENTRY_HEADER = struct.Struct(">dd")  # logical expiry (unix time) and compute time of values that can be refreshed
+
+# in-process tier of the functions cached with ``local_ttl``, values are stored as (value, ttl in seconds)
+local_cache: TLRUCache[str, tuple[Any, float]] = TLRUCache(
+    maxsize=LOCAL_CACHE_SIZE,
+    ttu=lambda _key, value, now: now + value[1],
+)
+
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call('smembers', tag)) do
+        redis.call('del', key)
+        redis.call('publish', ARGV[1], key)
+        table.insert(deleted, key)
+    end
+    redis.call('del', tag)
+end
+return deleted
+"""
+
+# deletes a lock only if it still holds the token of its owner, it may have expired and been taken by another process
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+_invalidate_tags_script = redis_client.register_script(INVALIDATE_TAGS_SCRIPT)
+
+# while Redis fails, the cache is bypassed and values are only kept in the local tier for LOCAL_TTL
+breaker = CircuitBreaker(settings.CACHE_BREAKER_THRESHOLD, settings.CACHE_BREAKER_RESET)
+
+_in_flight: dict[str, asyncio.Future] = {}
+_background: set[asyncio.Task] = set()
 
 
 def build_key(*args: tuple[str, Any], **kwargs: dict[str, Any]) -> str:
@@ -22,57 +79,341 @@ def build_key(*args: tuple[str, Any], **kwargs: dict[str, Any]) -> str:
     return f"{args_str}:{kwargs_str}"
 
 
+async def call_redis(
+    call: Callable[[], Awaitable[T]],
+    default: T | None = None,
+    metrics: CacheMetrics | None = None,
+    command: str = "",
+) -> T | None:
+    """Run a cache command with a timeout, return ``default`` instead if Redis fails or is bypassed.
+
+    Cache failures never reach the callers, they only feed the circuit breaker.
+    """
+    if not breaker.allow():
+        return default
+
+    try:
+        with metrics.redis(command) if metrics else contextlib.nullcontext():
+            result = await asyncio.wait_for(call(), timeout=settings.CACHE_TIMEOUT)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        breaker.record_failure()
+        logger.warning(f"cache command failed | command: {command} | error: {e!r} | bypassed: {breaker.is_open}")
+        return default
+    except BaseException:
+        breaker.release()
+        raise
+
+    breaker.record_success()
+    return result
+
+
 async def set_redis_value(
-    key: bytes | str, value: bytes | str, ttl: int | timedelta | None = DEFAULT_TTL, is_transaction: bool = False
+    key: bytes | str, value: bytes | str, ttl: int | timedelta | None = DEFAULT_TTL, tags: Iterable[str] = ()
 ) -> None:
-    """Set a value in Redis with an optional time-to-live (TTL)."""
-    async with redis_client.pipeline(transaction=is_transaction) as pipeline:
-        await pipeline.set(key, value)
-        if ttl:
-            await pipeline.expire(key, ttl)
+    """Set a value in Redis with an optional time-to-live (TTL), and add its key to the sets of its tags."""
+    if not tags:
+        await redis_client.set(key, value, ex=ttl or None)
+        return
 
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        pipeline.set(key, value, ex=ttl or None)
+        add_tags(pipeline, key, tags, ttl)
         await pipeline.execute()
 
 
+def tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+
+def add_tags(pipeline: Pipeline, key: str, tags: Iterable[str], ttl: int | timedelta | None) -> None:
+    """Queue the commands adding ``key`` to its tags, a tag set lives as long as its longest-lived key."""
+    for tag in tags:
+        pipeline.sadd(tag_key(tag), key)
+        if ttl:
+            pipeline.expire(tag_key(tag), ttl, nx=True)
+            pipeline.expire(tag_key(tag), ttl, gt=True)
+
+
+class KeySpace:
+    """Keys and value format of one cached function."""
+
+    def __init__(
+        self,
+        prefix: str,
+        key_builder: Callable[..., str],
+        serializer: AbstractSerializer,
+        ttl: int | timedelta,
+        stale_ttl: int | timedelta | None,
+        early_refresh: float | None,
+        tags: Callable[..., Iterable[str]] | None = None,
+        metrics: CacheMetrics | None = None,
+    ) -> None:
+        self.prefix = prefix
+        self.metrics = metrics or CacheMetrics(*prefix.split(":", 1))
+        self.key_builder = key_builder
+        self.tags_builder = tags
+        self.serializer = serializer
+        self.ttl = ttl.total_seconds() if isinstance(ttl, timedelta) else ttl
+        self.stale_ttl = (stale_ttl.total_seconds() if isinstance(stale_ttl, timedelta) else stale_ttl) or 0
+        self.refreshable = bool(self.stale_ttl or early_refresh)
+
+    @property
+    def redis_ttl(self) -> int:
+        return int(self.ttl + self.stale_ttl)
+
+    def key(self, *args: Any, **kwargs: Any) -> str:
+        return f"{self.prefix}:{self.key_builder(*args, **kwargs)}"
+
+    def tags(self, *args: Any, **kwargs: Any) -> Iterable[str]:
+        if self.tags_builder is None:
+            return ()
+        return self.tags_builder(*args, **kwargs)
+
+    def encode(self, result: Any, delta: float = 0.0) -> bytes:
+        value = self.serializer.serialize(result)
+        if self.refreshable:
+            value = pack_entry(value, time.time() + self.ttl, delta)
+        return value
+
+    def decode(self, value: bytes) -> tuple[Any, float | None, float]:
+        """Return the cached result, its logical expiry time (None if it has none) and its compute time."""
+        if not self.refreshable:
+            return self.serializer.deserialize(value), None, 0.0
+        value, expires_at, delta = unpack_entry(value)
+        return self.serializer.deserialize(value), expires_at, delta
+
+
 def cached(
     ttl: int | timedelta = DEFAULT_TTL,
     namespace: str = "main",
     cache: Redis = redis_client,
     key_builder: Callable[..., str] = build_key,
     serializer: AbstractSerializer | None = None,
+    local_ttl: int | timedelta | None = None,
+    lock_timeout: float | None = None,
+    stale_ttl: int | timedelta | None = None,
+    early_refresh: float | None = None,
+    tags: Callable[..., Iterable[str]] | None = None,
 ) -> Callable:
-    """Caches the functions return value into a key generated with module_name, function_name and args."""
+    """Caches the functions return value into a key generated with module_name, function_name and args.
+
+    With ``local_ttl`` the value is also kept in the memory of the process for that long,
+    ``clear_cache`` drops it from every process through Redis pub/sub.
+
+    Concurrent misses of a key in one process run the function once and share its result.
+    With ``lock_timeout`` the processes also take a Redis lock, so only one of them runs the function
+    while the others wait up to ``lock_timeout`` seconds for its value.
+
+    With ``stale_ttl`` an expired value is still returned for that long while it is refreshed in the background.
+    With ``early_refresh`` (the XFetch beta, 1.0 is a good start) a value may be refreshed in the background
+    before it expires, the closer to expiry and the slower the function, the more likely,
+    so the refreshes of hot keys do not all happen at the same moment.
+    Background refreshes open their own database sessions instead of the caller's one.
+
+    ``tags`` takes the arguments of the function and returns the tags of its value, like ``user:1``,
+    ``invalidate_tags`` drops every value of a tag at once.
+    """
     if serializer is None:
         serializer = PickleSerializer()
+    if isinstance(local_ttl, timedelta):
+        local_ttl = local_ttl.total_seconds()
 
     def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def wrapper(*args: tuple[str, Any], **kwargs: dict[str, Any]) -> Any:
-            key = key_builder(*args, **kwargs)
-            key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
-
-            # Check if the key is in the cache
-            cached_value = await cache.get(key)
-            if cached_value is not None:
-                return serializer.deserialize(cached_value)
+        keyspace = KeySpace(
+            prefix=f"{namespace}:{func.__module__}:{func.__name__}",
+            key_builder=key_builder,
+            serializer=serializer,
+            ttl=ttl,
+            stale_ttl=stale_ttl,
+            early_refresh=early_refresh,
+            tags=tags,
+            metrics=CacheMetrics(namespace, f"{func.__module__}.{func.__name__}"),
+        )
+        metrics = keyspace.metrics
 
+        async def compute(key: str, *args: tuple[str, Any], **kwargs: dict[str, Any]) -> Any:
             # If not in cache, call the original function
-            result = await func(*args, **kwargs)
+            started = time.monotonic()
+            with metrics.compute():
+                result = await func(*args, **kwargs)
+            value = keyspace.encode(result, time.monotonic() - started)
+            metrics.bytes_written.inc(len(value))
 
             # Store the result in Redis
-            await set_redis_value(
-                key=key,
-                value=serializer.serialize(result),
-                ttl=ttl,
+            await call_redis(
+                lambda: set_redis_value(
+                    key=key,
+                    value=value,
+                    ttl=keyspace.redis_ttl,
+                    tags=keyspace.tags(*args, **kwargs),
+                ),
+                metrics=metrics,
+                command="set",
             )
+            return result
+
+        async def refresh(key: str, *args: tuple[str, Any], **kwargs: dict[str, Any]) -> None:
+            async with contextlib.AsyncExitStack() as stack:
+                args, kwargs = await with_fresh_sessions(stack, args, kwargs)
+                await compute(key, *args, **kwargs)
+
+        async def load(key: str, *args: tuple[str, Any], **kwargs: dict[str, Any]) -> Any:
+            # Check if the key is in the cache
+            cached_value = await call_redis(lambda: cache.get(key), metrics=metrics, command="get")
+            lock_token = None
+            if cached_value is None and lock_timeout:
+                lock_token = await acquire_lock(cache, key, lock_timeout)
+                if lock_token is None:
+                    cached_value = await wait_for_value(cache, key, lock_timeout)
+
+            if cached_value is None:
+                metrics.misses.inc()
+                try:
+                    result = await compute(key, *args, **kwargs)
+                finally:
+                    if lock_token is not None:
+                        await release_lock(cache, key, lock_token)
+            else:
+                metrics.redis_hits.inc()
+                metrics.bytes_read.inc(len(cached_value))
+                result, expires_at, delta = keyspace.decode(cached_value)
+                if expires_at is not None and should_refresh(expires_at, delta, early_refresh):
+                    run_in_background(single_flight(f"refresh:{key}", lambda: refresh(key, *args, **kwargs)))
 
+            if local_ttl or breaker.is_open:
+                local_cache[key] = (result, local_ttl or LOCAL_TTL)
             return result
 
+        @wraps(func)
+        async def wrapper(*args: tuple[str, Any], **kwargs: dict[str, Any]) -> Any:
+            key = keyspace.key(*args, **kwargs)
+
+            # values of functions without local_ttl are only there while Redis is bypassed
+            entry = local_cache.get(key)
+            if entry is not None:
+                metrics.local_hits.inc()
+                return entry[0]
+
+            return await single_flight(key, lambda: load(key, *args, **kwargs))
+
         return wrapper
 
     return decorator
 
 
+def pack_entry(value: bytes, expires_at: float, delta: float) -> bytes:
+    """Prefix a serialized value with its logical expiry time and the time it took to compute."""
+    return ENTRY_HEADER.pack(expires_at, delta) + value
+
+
+def unpack_entry(entry: bytes) -> tuple[bytes, float, float]:
+    expires_at, delta = ENTRY_HEADER.unpack_from(entry)
+    return entry[ENTRY_HEADER.size :], expires_at, delta
+
+
+def should_refresh(expires_at: float, delta: float, beta: float | None) -> bool:
+    """True once the value expired, or earlier at random when ``beta`` is set (XFetch)."""
+    now = time.time()
+    if beta:
+        # 1 - random() is in (0, 1], log() of it is never a math domain error
+        now -= delta * beta * math.log(1 - random.random())  # noqa: S311
+    return now >= expires_at
+
+
+async def with_fresh_sessions(
+    stack: contextlib.AsyncExitStack, args: tuple[Any, ...], kwargs: dict[str, Any]
+) -> tuple[tuple[Any, ...], dict[str, Any]]:
+    """Replace the database sessions among the arguments, the caller closes its own one as soon as it returns."""
+
+    async def fresh(value: Any) -> Any:
+        if isinstance(value, (AsyncSession, LazySession)):
+            return await stack.enter_async_context(sessionmaker())
+        return value
+
+    return (
+        tuple([await fresh(arg) for arg in args]),
+        {name: await fresh(value) for name, value in kwargs.items()},
+    )
+
+
+def run_in_background(coroutine: Coroutine[Any, Any, Any]) -> None:
+    task = asyncio.create_task(coroutine)
+    _background.add(task)
+    task.add_done_callback(_log_background_failure)
+
+
+def _log_background_failure(task: asyncio.Task) -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.opt(exception=task.exception()).error("cache refresh failed")
+
+
+async def single_flight(key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Run ``load`` unless a load of the same key is already running in the process, then share its result.
+
+    The load runs in the task of the caller that started it, with its arguments (sessions included). If that caller
+    is cancelled the load is too, and the callers waiting for it start another one.
+    """
+    while (in_flight := _in_flight.get(key)) is not None:
+        # wait() never cancels the load, a cancelled caller leaves it to the others
+        await asyncio.wait({in_flight})
+        if not in_flight.cancelled():
+            return in_flight.result()
+
+    future = _in_flight[key] = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())  # no warning if nobody else awaited it
+    try:
+        result = await load()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _in_flight[key]
+
+
+def lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+
+async def acquire_lock(cache: Redis, key: str, timeout: float) -> str | None:
+    """Take the lock of the key and return its owner token, None if another process holds it.
+
+    A token is also returned if Redis fails, since there is nobody to wait for then.
+    """
+    token = secrets.token_hex(8)
+    taken = await call_redis(
+        lambda: cache.set(lock_key(key), token, nx=True, px=int(timeout * 1000)),
+        default=True,
+        command="lock",
+    )
+    return token if taken else None
+
+
+async def release_lock(cache: Redis, key: str, token: str) -> None:
+    await call_redis(
+        lambda: cache.register_script(RELEASE_LOCK_SCRIPT)(keys=[lock_key(key)], args=[token]),
+        command="unlock",
+    )
+
+
+async def wait_for_value(cache: Redis, key: str, timeout: float) -> bytes | None:
+    """Poll the key filled by the lock holder, None if it did not show up in time."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value = await call_redis(lambda: cache.get(key), command="get")
+        if value is not None or breaker.is_open:
+            return value
+    return None
+
+
 async def clear_cache(
     func: Callable,
     *args: Any,
@@ -94,4 +435,42 @@ async def clear_cache(
     key = build_key(*args, **kwargs)
     key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
 
-    await redis_client.delete(key)
+    local_cache.pop(key, None)
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        pipeline.delete(key)
+        pipeline.publish(INVALIDATION_CHANNEL, key)
+        await call_redis(pipeline.execute, command="clear")
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Drop the values of every function cached with one of ``tags``, in every tier and in one round-trip."""
+    keys = await call_redis(
+        lambda: _invalidate_tags_script(keys=[tag_key(tag) for tag in tags], args=[INVALIDATION_CHANNEL]),
+        default=[],
+        command="invalidate",
+    )
+    for key in keys:
+        local_cache.pop(key.decode(), None)
+
+
+async def listen_invalidations(cache: Redis = pubsub_redis_client) -> None:
+    """Drop the keys cleared by other processes from the local tier, runs until cancelled."""
+    while True:
+        pubsub = cache.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # invalidations sent while unsubscribed are lost, start over from an empty local tier
+            local_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    local_cache.pop(message["data"].decode(), None)
+        except (RedisError, OSError):
+            logger.exception("cache invalidation listener disconnected")
+            await asyncio.sleep(1)
+        finally:
+            with contextlib.suppress(RedisError, OSError):
+                await pubsub.aclose()
+
+
+def start_invalidation_listener() -> asyncio.Task:
+    return asyncio.create_task(listen_invalidations())
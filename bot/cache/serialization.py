@@ -1,9 +1,14 @@
 # ruff: noqa: S301
+from __future__ import annotations
 import pickle
+import zlib
 from abc import ABC, abstractmethod
+from datetime import datetime
 from typing import Any
 
 import orjson
+from pydantic import BaseModel
+from sqlalchemy import inspect as sa_inspect
 
 
 class AbstractSerializer(ABC):
@@ -36,3 +41,74 @@ class JSONSerializer(AbstractSerializer):
     def deserialize(self, obj: str) -> Any:
         "Deserialize values using JSON."
         return orjson.loads(obj)
+
+
+class ModelSerializer(AbstractSerializer):
+    """Serialize SQLAlchemy or pydantic models, or lists of them, as JSON of their columns.
+
+    Much smaller and faster to load than pickled ORM instances, which carry their whole instance state.
+    Loaded SQLAlchemy models are transient, like any cached value they must not be modified and saved.
+    """
+
+    def __init__(self, model: type[Any]) -> None:
+        self.model = model
+        self.is_pydantic = issubclass(model, BaseModel)
+        if not self.is_pydantic:
+            columns = sa_inspect(model).columns
+            self.columns = [column.key for column in columns]
+            self.datetime_columns = [column.key for column in columns if _python_type(column) is datetime]
+
+    def serialize(self, obj: Any) -> bytes:
+        if isinstance(obj, list):
+            return orjson.dumps([self._dump(item) for item in obj])
+        return orjson.dumps(None if obj is None else self._dump(obj))
+
+    def deserialize(self, obj: bytes) -> Any:
+        data = orjson.loads(obj)
+        if isinstance(data, list):
+            return [self._load(item) for item in data]
+        return None if data is None else self._load(data)
+
+    def _dump(self, obj: Any) -> dict[str, Any]:
+        if self.is_pydantic:
+            return obj.model_dump(mode="json")
+        return {column: getattr(obj, column) for column in self.columns}
+
+    def _load(self, data: dict[str, Any]) -> Any:
+        if self.is_pydantic:
+            return self.model.model_validate(data)
+        for column in self.datetime_columns:
+            if data[column] is not None:
+                data[column] = datetime.fromisoformat(data[column])
+        return self.model(**data)
+
+
+class CompressedSerializer(AbstractSerializer):
+    """Compress with zlib the values of another serializer once they are larger than ``threshold`` bytes."""
+
+    RAW = b"\x00"
+    ZLIB = b"\x01"
+
+    def __init__(self, serializer: AbstractSerializer, threshold: int = 1024, level: int = 1) -> None:
+        self.serializer = serializer
+        self.threshold = threshold
+        self.level = level
+
+    def serialize(self, obj: Any) -> bytes:
+        value = self.serializer.serialize(obj)
+        if len(value) < self.threshold:
+            return self.RAW + value
+        return self.ZLIB + zlib.compress(value, self.level)
+
+    def deserialize(self, obj: bytes) -> Any:
+        value = obj[1:]
+        if obj[:1] == self.ZLIB:
+            value = zlib.decompress(value)
+        return self.serializer.deserialize(value)
+
+
+def _python_type(column: Any) -> type | None:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
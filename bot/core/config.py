@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -45,6 +45,15 @@ class DBSettings(EnvBaseSettings):
     DB_USER: str = "postgres"
     DB_PASS: str | None = None
     DB_NAME: str = "postgres"
+    DB_POOL_MODE: Literal["direct", "pgbouncer"] = "direct"  # "pgbouncer" when it pools in transaction mode
+    DB_POOL_SIZE: int = 10  # connections kept open by each process
+    DB_MAX_OVERFLOW: int = 10  # extra connections opened under load, closed once returned
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds after which a connection is replaced
+    DB_POOL_PRE_PING: bool = True  # check connections when they are checked out
+    DB_REPLICA_HOST: str | None = None  # read-only functions go to this replica when set
+    DB_REPLICA_PORT: int = 5432
+    DB_REPLICA_MAX_LAG: float = 5.0  # seconds the replica may be behind, the primary is used above it
 
     @property
     def database_url(self) -> URL | str:
@@ -52,6 +61,13 @@ class DBSettings(EnvBaseSettings):
             return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         return f"postgresql+asyncpg://{self.DB_USER}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def replica_database_url(self) -> str | None:
+        if not self.DB_REPLICA_HOST:
+            return None
+        credentials = f"{self.DB_USER}:{self.DB_PASS}" if self.DB_PASS else self.DB_USER
+        return f"postgresql+asyncpg://{credentials}@{self.DB_REPLICA_HOST}:{self.DB_REPLICA_PORT}/{self.DB_NAME}"
+
     @property
     def database_url_psycopg2(self) -> str:
         if self.DB_PASS:
@@ -63,6 +79,10 @@ class CacheSettings(EnvBaseSettings):
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_PASS: str | None = None
+    REDIS_SOCKET_TIMEOUT: float = 2.0  # seconds, bounds every command including the FSM storage
+    CACHE_TIMEOUT: float = 0.5  # seconds a cache command may take before the cache is bypassed
+    CACHE_BREAKER_THRESHOLD: int = 5  # failed cache commands in a row that stop using Redis for a while
+    CACHE_BREAKER_RESET: float = 30.0  # seconds before Redis is tried again
 
     # REDIS_DATABASE: int = 1
     # REDIS_USERNAME: int | None = None
@@ -76,7 +96,15 @@ class CacheSettings(EnvBaseSettings):
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
 
 
-class Settings(BotSettings, DBSettings, CacheSettings):
+class GameSettings(EnvBaseSettings):
+    ROOM_STORE: Literal["memory", "redis"] = "memory"
+    GAME_ENGINES: dict[int, str] = {1: "ticktacktoe"}  # GameModel.id -> name of the engine
+    ROOM_TTL: int = 900  # seconds a room without any activity is kept
+    FINISHED_ROOM_TTL: int = 60  # seconds a finished room is kept for late resyncs
+    MAX_ROOMS: int = 10_000
+
+
+class Settings(BotSettings, DBSettings, CacheSettings, GameSettings):
     DEBUG: bool = False
 
     SENTRY_DSN: str | None = None
@@ -19,6 +19,20 @@ redis_client = Redis(
         port=settings.REDIS_PORT,
         password=settings.REDIS_PASS,
         db=0,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    ),
+)
+
+# subscriptions wait for messages indefinitely, so they cannot share the read timeout of redis_client
+pubsub_redis_client = Redis(
+    connection_pool=ConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASS,
+        db=0,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
     ),
 )
 
@@ -1,8 +1,9 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 from uuid import uuid4
 
-from asyncpg import Connection
+import prometheus_client
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from bot.core.config import settings
@@ -10,20 +11,38 @@ from bot.core.config import settings
 if TYPE_CHECKING:
     from sqlalchemy.engine.url import URL
 
+METRICS_PREFIX = "tgbot_db_pool"
 
-class CConnection(Connection):
-    def _get_unique_id(self, prefix: str) -> str:
-        return f"__asyncpg_{prefix}_{uuid4()}__"
+
+def prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def get_connect_args(pool_mode: str = settings.DB_POOL_MODE) -> dict[str, Any]:
+    """Arguments of the asyncpg connections.
+
+    Behind pgbouncer in transaction mode consecutive statements may run on different server connections,
+    so nothing is cached and every prepared statement gets a name no other client can take.
+    """
+    if pool_mode == "pgbouncer":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": prepared_statement_name,
+        }
+    return {}
 
 
 def get_engine(url: URL | str = settings.database_url) -> AsyncEngine:
     return create_async_engine(
         url=url,
         echo=settings.DEBUG,
-        pool_size=0,
-        connect_args={
-            "connection_class": CConnection,
-        },
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=get_connect_args(),
     )
 
 
@@ -31,6 +50,57 @@ def get_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
     return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 
+class LazySession:
+    """An ``AsyncSession`` created on first use, for code paths that often don't touch the database.
+
+    A session already checks out a connection only for its first statement, this also saves building
+    and closing the session itself. Everything else is forwarded to the real session.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        self._session_factory = session_factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    def in_transaction(self) -> bool:
+        return self._session is not None and self._session.in_transaction()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> LazySession:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+
+def export_pool_metrics(engine: AsyncEngine, metrics_prefix: str = METRICS_PREFIX) -> None:
+    """Expose the state of the connection pool of ``engine``, read when the metrics are scraped."""
+    pool = engine.pool
+    prometheus_client.Gauge(f"{metrics_prefix}_size", "Connections the pool keeps open").set_function(pool.size)
+    prometheus_client.Gauge(f"{metrics_prefix}_checked_in", "Idle connections in the pool").set_function(
+        pool.checkedin,
+    )
+    prometheus_client.Gauge(f"{metrics_prefix}_checked_out", "Connections in use").set_function(pool.checkedout)
+    prometheus_client.Gauge(f"{metrics_prefix}_overflow", "Connections opened above the pool size").set_function(
+        lambda: max(pool.overflow(), 0),
+    )
+
+    connects_metric = prometheus_client.Counter(f"{metrics_prefix}_connects", "New database connections opened")
+    event.listen(engine.sync_engine, "connect", lambda *_: connects_metric.inc())
+
+
 db_url = settings.database_url
 engine = get_engine(url=db_url)
 sessionmaker = get_sessionmaker(engine)
+export_pool_metrics(engine)
@@ -2,4 +2,4 @@ from .base import *
 from .user import *
 from .game import *
 
-__all__ = ["Base", "UserModel", "GameModel"]
+__all__ = ["Base", "UserModel", "GameModel", "UserGameModel", "RoomSettlementModel"]
@@ -1,7 +1,7 @@
 # ruff: noqa: TCH001, TCH003, A003, F821
 from __future__ import annotations
 
-from sqlalchemy import Enum
+from sqlalchemy import ARRAY, BigInteger, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from bot.database.models.base import Base, created_at, int_pk
@@ -9,6 +9,10 @@ from bot.database.models.base import Base, created_at, int_pk
 
 class GameModel(Base):
     __tablename__ = "games"
+    __table_args__ = (
+        # trigram index, serves the ILIKE '%query%' of inline queries
+        Index("ix_games_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
     id: Mapped[int_pk]
     title: Mapped[str]
     description: Mapped[str]
@@ -23,11 +27,24 @@ class GameModel(Base):
 
 
 class UserGameModel(Base):
+    """One row per player of a finished match."""
+
     __tablename__ = "user_games"
-    id: Mapped[int_pk]
-    user_id: Mapped[int_pk]
-    game_id: Mapped[int_pk]
+    __table_args__ = (Index("ix_user_games_user_id_game_id", "user_id", "game_id"),)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    game_id: Mapped[int]
+    room_id: Mapped[str | None]
 
-    score: Mapped[float]
+    score: Mapped[float]  # 1 for a win, 0.5 for a draw, 0 for a loss
     bet: Mapped[float]
-    opponents: Mapped[list[int] | None]
+    opponents: Mapped[list[int] | None] = mapped_column(ARRAY(BigInteger))
+    created_at: Mapped[created_at]
+
+
+class RoomSettlementModel(Base):
+    """Marks a room whose money was already settled, so a settlement is applied only once."""
+
+    __tablename__ = "room_settlements"
+    id: Mapped[str] = mapped_column(primary_key=True)
+    created_at: Mapped[created_at]
@@ -1,6 +1,7 @@
 # ruff: noqa: TCH001, TCH003, A003, F821
 from __future__ import annotations
 
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from bot.database.models.base import Base, created_at, int_pk
@@ -8,6 +9,9 @@ from bot.database.models.base import Base, created_at, int_pk
 
 class UserModel(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),  # new users counts and the default sort of the admin panel
+    )
 
     id: Mapped[int_pk]
     first_name: Mapped[str]
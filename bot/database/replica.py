@@ -0,0 +1,112 @@
+from __future__ import annotations
+import asyncio
+import functools
+import math
+import time
+from typing import TYPE_CHECKING, Any
+
+import prometheus_client
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from bot.core.config import settings
+from bot.database.database import export_pool_metrics, get_engine, get_sessionmaker
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+LAG_CHECK_INTERVAL = 1.0
+LAG_CHECK_TIMEOUT = 1.0
+FAILURE_BACKOFF = 30.0
+REPLICA_ERRORS = (OSError, asyncio.TimeoutError, DBAPIError)
+
+# the last replayed transaction gets old while the primary is idle, a replica that replayed all it received is not late
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END",
+)
+
+lag_metric = prometheus_client.Gauge("tgbot_db_replica_lag", "Seconds the read replica is behind the primary")
+
+
+class ReplicaRouter:
+    """Tells whether the replica may serve reads, from its replication lag measured at most every ``check_interval``.
+
+    A replica that fails is left alone for ``failure_backoff`` seconds.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] | None,
+        check_interval: float = LAG_CHECK_INTERVAL,
+        failure_backoff: float = FAILURE_BACKOFF,
+    ) -> None:
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self.failure_backoff = failure_backoff
+        self.lag = math.inf
+        self._next_check = -math.inf
+        self._lock = asyncio.Lock()
+
+    async def is_fresh(self, max_lag: float = settings.DB_REPLICA_MAX_LAG) -> bool:
+        if self.session_factory is None:
+            return False
+        if time.monotonic() >= self._next_check:
+            async with self._lock:
+                if time.monotonic() >= self._next_check:
+                    await self.check_lag()
+        return self.lag <= max_lag
+
+    async def check_lag(self) -> None:
+        try:
+            async with self.session_factory() as session:
+                lag = await asyncio.wait_for(session.scalar(REPLICA_LAG_QUERY), timeout=LAG_CHECK_TIMEOUT)
+        except REPLICA_ERRORS:
+            logger.exception("replica lag check failed")
+            self.mark_failed()
+            return
+
+        self.lag = float(lag)
+        self._next_check = time.monotonic() + self.check_interval
+        lag_metric.set(self.lag)
+
+    def mark_failed(self) -> None:
+        self.lag = math.inf
+        self._next_check = time.monotonic() + self.failure_backoff
+        lag_metric.set(self.lag)
+
+
+def read_only(max_lag: float = settings.DB_REPLICA_MAX_LAG) -> Callable:
+    """Run the decorated function with a replica session while the replica is at most ``max_lag`` seconds late.
+
+    The session of the caller, the first argument, is used instead when the replica is late or fails, and when
+    it already has a transaction open, whose writes the replica can't see.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(session: AsyncSession, *args: Any, **kwargs: Any) -> Any:
+            if session.in_transaction() or not await replica.is_fresh(max_lag):
+                return await func(session, *args, **kwargs)
+
+            try:
+                async with replica.session_factory() as replica_session:
+                    return await func(replica_session, *args, **kwargs)
+            except REPLICA_ERRORS:
+                logger.exception(f"replica read failed, using the primary | function: {func.__qualname__}")
+                replica.mark_failed()
+            return await func(session, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+replica_url = settings.replica_database_url
+replica_engine = get_engine(url=replica_url) if replica_url else None
+replica = ReplicaRouter(get_sessionmaker(replica_engine) if replica_engine else None)
+if replica_engine is not None:
+    export_pool_metrics(replica_engine, metrics_prefix="tgbot_db_replica_pool")
@@ -1,5 +1,8 @@
+from typing import Literal
+
 from aiogram.filters.callback_data import CallbackData
 
 
-class OffsetOfGameFactory(CallbackData, prefix="games"):
-    offset: int = 0
+class GameCursorFactory(CallbackData, prefix="games"):
+    game_id: int = 0  # id of the game on screen, 0 before the first one
+    direction: Literal["next", "prev"] = "next"
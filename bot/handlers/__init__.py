@@ -2,10 +2,11 @@ from aiogram import Router
 
 
 def get_handlers_router() -> Router:
-    from . import export_users, start
+    from . import export_users, games, start
 
     router = Router()
     router.include_router(start.router)
     router.include_router(export_users.router)
+    router.include_router(games.router)
 
     return router
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from aiogram import Router, html
+
+from bot.filters.callbackdata import GameCursorFactory
+from bot.keyboards.inline.menu import games_keyboard
+from bot.services.games import get_game_by_cursor
+
+if TYPE_CHECKING:
+    from aiogram.types import CallbackQuery
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+router = Router(name="games")
+
+
+@router.callback_query(GameCursorFactory.filter())
+async def games_page_handler(query: CallbackQuery, callback_data: GameCursorFactory, session: AsyncSession) -> None:
+    """Show the game after or before the one on screen."""
+    game = await get_game_by_cursor(session, callback_data.game_id, callback_data.direction)
+    if game is None:
+        # past the first or the last game, the one on screen stays
+        return
+
+    text = f"{html.bold(html.quote(game.title))}\n\n{html.quote(game.description)}"
+    await query.message.edit_text(text, reply_markup=games_keyboard(game.id))
@@ -2,13 +2,14 @@ from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from aiogram.utils.i18n import gettext as _
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.filters.callbackdata import OffsetOfGameFactory
+from bot.filters.callbackdata import GameCursorFactory
 
 
 def main_keyboard() -> InlineKeyboardMarkup:
     """Use in main menu."""
     buttons = [
         [InlineKeyboardButton(text="🕹️ Играть", web_app=WebAppInfo(url="https://tg-bot.simplifyapp.ru/"))],
+        [InlineKeyboardButton(text="🎲 Игры", callback_data=GameCursorFactory().pack())],
         # [InlineKeyboardButton(text=_("money button"), callback_data="money")],
         # [InlineKeyboardButton(text=_("support button"), callback_data="support")],
     ]
@@ -18,3 +19,15 @@ def main_keyboard() -> InlineKeyboardMarkup:
     keyboard.adjust(1)
 
     return keyboard.as_markup()
+
+
+def games_keyboard(game_id: int) -> InlineKeyboardMarkup:
+    """Use to page through the games, one game at a time."""
+    keyboard = InlineKeyboardBuilder()
+
+    keyboard.button(text="⬅️", callback_data=GameCursorFactory(game_id=game_id, direction="prev"))
+    keyboard.button(text="➡️", callback_data=GameCursorFactory(game_id=game_id, direction="next"))
+
+    keyboard.adjust(2)
+
+    return keyboard.as_markup()
@@ -3,7 +3,7 @@ from typing import TYPE_CHECKING, Any
 
 from aiogram import BaseMiddleware
 
-from bot.database.database import sessionmaker
+from bot.database.database import LazySession, sessionmaker
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
@@ -18,6 +18,7 @@ class DatabaseMiddleware(BaseMiddleware):
         event: Update,
         data: dict[str, Any],
     ) -> Any:
-        async with sessionmaker() as session:
+        # most updates are throttled or answered from the cache, the session is only created if something uses it
+        async with LazySession(sessionmaker) as session:
             data["session"] = session
             return await handler(event, data)
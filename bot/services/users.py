@@ -1,17 +1,36 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, BinaryIO
 
-from sqlalchemy import func, select, update
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 
-from bot.cache.redis import build_key, cached, clear_cache
+from bot.cache.redis import DEFAULT_STALE_TTL, LOCAL_TTL, build_key, cached, invalidate_tags
+from bot.cache.serialization import CompressedSerializer, ModelSerializer
 from bot.core.config import settings
-from bot.database.models import UserModel
+from bot.database.models import RoomSettlementModel, UserModel
+from bot.database.replica import read_only
 import python_avatars as pa
 
 if TYPE_CHECKING:
     from aiogram.types import User
     from sqlalchemy.ext.asyncio import AsyncSession
 
+# every reader below is invalidated through its tags, the TTL only bounds edits made outside the bot (admin panel)
+USER_TTL = 600
+# the admin panel grants admin rights and deletes users without invalidating, authorization must catch up fast
+AUTH_TTL = 10
+ALL_USERS_TAG = "users:all"
+ALL_USERS_LOCK_TIMEOUT = 10.0
+USER_COUNT_LOCK_TIMEOUT = 2.0
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def user_tags(session: AsyncSession, user_id: int) -> list[str]:  # noqa: ARG001
+    return [user_tag(user_id)]
+
 
 async def add_user(
         session: AsyncSession,
@@ -57,16 +76,49 @@ async def add_user(
 
     session.add(new_user)
     await session.commit()
-    await clear_cache(user_exists, user_id)
+    await invalidate_tags(user_tag(user_id), ALL_USERS_TAG)
 
 
 async def add_money_by_id(session: AsyncSession, user_id: int, new_count_money: float) -> None:
     query = update(UserModel).where(UserModel.id == user_id).values(money=new_count_money)
     await session.execute(query)
     await session.commit()
+    await invalidate_tags(ALL_USERS_TAG)
+
+
+async def settle_money(session: AsyncSession, settlement_id: str, deltas: dict[int, float]) -> bool:
+    """Apply the money changes of a game in one statement.
+
+    Only the first call with a given ``settlement_id`` changes balances, the next ones return False.
+    """
+    if not deltas:
+        return False
+
+    settled = (
+        insert(RoomSettlementModel)
+        .values(id=settlement_id)
+        .on_conflict_do_nothing()
+        .returning(RoomSettlementModel.id)
+        .cte("settled")
+    )
+    money_delta = case(*((UserModel.id == user_id, delta) for user_id, delta in deltas.items()), else_=0.0)
+    query = (
+        update(UserModel)
+        .where(UserModel.id.in_(deltas), select(settled.c.id).exists())
+        .values(money=UserModel.money + money_delta)
+        .add_cte(settled)
+    )
+
+    result = await session.execute(query)
+    await session.commit()
+    if not result.rowcount:
+        return False
 
+    await invalidate_tags(ALL_USERS_TAG)
+    return True
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+
+@cached(ttl=AUTH_TTL, key_builder=lambda session, user_id: build_key(user_id), tags=user_tags, local_ttl=LOCAL_TTL)
 async def user_exists(session: AsyncSession, user_id: int) -> bool:
     """Checks if the user is in the database."""
     query = select(UserModel.id).filter_by(id=user_id).limit(1)
@@ -77,7 +129,13 @@ async def user_exists(session: AsyncSession, user_id: int) -> bool:
     return bool(user)
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@cached(
+    ttl=USER_TTL,
+    key_builder=lambda session, user_id: build_key(user_id),
+    tags=user_tags,
+    stale_ttl=DEFAULT_STALE_TTL,
+    early_refresh=1.0,
+)
 async def get_first_name(session: AsyncSession, user_id: int) -> str:
     query = select(UserModel.first_name).filter_by(id=user_id)
 
@@ -87,7 +145,14 @@ async def get_first_name(session: AsyncSession, user_id: int) -> str:
     return first_name or ""
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@cached(
+    ttl=USER_TTL,
+    key_builder=lambda session, user_id: build_key(user_id),
+    tags=user_tags,
+    local_ttl=LOCAL_TTL,
+    stale_ttl=DEFAULT_STALE_TTL,
+    early_refresh=1.0,
+)
 async def get_language_code(session: AsyncSession, user_id: int) -> str:
     query = select(UserModel.language_code).filter_by(id=user_id)
 
@@ -97,6 +162,19 @@ async def get_language_code(session: AsyncSession, user_id: int) -> str:
     return language_code or ""
 
 
+@cached(ttl=USER_TTL, key_builder=lambda session, user_id: build_key(user_id), tags=user_tags)
+async def get_player_profile(session: AsyncSession, user_id: int) -> dict[str, str | None] | None:
+    """Public part of the user shown to the other players of a game room."""
+    query = select(UserModel.first_name, UserModel.last_name, UserModel.username, UserModel.avatar_url).filter_by(
+        id=user_id,
+    )
+
+    result = await session.execute(query)
+
+    profile = result.one_or_none()
+    return profile._asdict() if profile else None
+
+
 async def get_user_money(session: AsyncSession, user_id: int) -> float:
     query = select(UserModel.money).filter_by(id=user_id)
 
@@ -106,6 +184,7 @@ async def get_user_money(session: AsyncSession, user_id: int) -> float:
     return money or 0.0
 
 
+@read_only()
 async def get_user_data(session: AsyncSession, user_id: int):
     query = select(UserModel).filter_by(id=user_id)
 
@@ -124,9 +203,10 @@ async def set_language_code(
 
     await session.execute(stmt)
     await session.commit()
+    await invalidate_tags(user_tag(user_id), ALL_USERS_TAG)
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@cached(ttl=AUTH_TTL, key_builder=lambda session, user_id: build_key(user_id), tags=user_tags, local_ttl=LOCAL_TTL)
 async def is_admin(session: AsyncSession, user_id: int) -> bool:
     query = select(UserModel.is_admin).filter_by(id=user_id)
 
@@ -141,9 +221,17 @@ async def set_is_admin(session: AsyncSession, user_id: int, is_admin: bool) -> N
 
     await session.execute(stmt)
     await session.commit()
+    await invalidate_tags(user_tag(user_id), ALL_USERS_TAG)
 
 
-@cached(key_builder=lambda session: build_key())
+@cached(
+    ttl=USER_TTL,
+    key_builder=lambda session: build_key(),
+    tags=lambda session: [ALL_USERS_TAG],
+    serializer=CompressedSerializer(ModelSerializer(UserModel)),
+    lock_timeout=ALL_USERS_LOCK_TIMEOUT,
+)
+@read_only()
 async def get_all_users(session: AsyncSession) -> list[UserModel]:
     query = select(UserModel)
 
@@ -153,7 +241,15 @@ async def get_all_users(session: AsyncSession) -> list[UserModel]:
     return list(users)
 
 
-@cached(key_builder=lambda session: build_key())
+@cached(
+    ttl=USER_TTL,
+    key_builder=lambda session: build_key(),
+    tags=lambda session: [ALL_USERS_TAG],
+    lock_timeout=USER_COUNT_LOCK_TIMEOUT,
+    stale_ttl=DEFAULT_STALE_TTL,
+    early_refresh=1.0,
+)
+@read_only()
 async def get_user_count(session: AsyncSession) -> int:
     query = select(func.count()).select_from(UserModel)
 
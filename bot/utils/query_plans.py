@@ -0,0 +1,55 @@
+"""Plans of the indexed queries, with and without their indexes.
+
+python -m bot.utils.query_plans
+
+Every query is explained twice with EXPLAIN ANALYZE, once with index scans disabled, as before the indexes existed,
+then as the planner picks it. Run it on a copy of production data, on a few rows a sequential scan always wins.
+"""
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+
+from bot.database.database import sessionmaker
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+QUERIES = {
+    "new users (admin dashboard)": (
+        "SELECT count(*) FROM users WHERE created_at >= TIMEZONE('utc', now()) - interval '1 day'"
+    ),
+    "users page (admin panel)": "SELECT * FROM users ORDER BY created_at DESC LIMIT 20",
+    "inline games": "SELECT * FROM games WHERE title ILIKE '%tic%' ORDER BY id LIMIT 10",
+    "match history of a user": (
+        "SELECT * FROM user_games WHERE user_id = (SELECT user_id FROM user_games LIMIT 1) AND game_id = 1"
+    ),
+}
+NO_INDEX_SETTINGS = ("enable_indexscan", "enable_indexonlyscan", "enable_bitmapscan")
+
+
+async def explain(session: AsyncSession, query: str, use_indexes: bool) -> str:
+    try:
+        if not use_indexes:
+            for setting in NO_INDEX_SETTINGS:
+                await session.execute(text(f"SET LOCAL {setting} = off"))
+        result = await session.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"))
+        return "\n".join(result.scalars())
+    finally:
+        # ends the transaction, and the SET LOCAL with it
+        await session.rollback()
+
+
+async def main() -> None:
+    async with sessionmaker() as session:
+        for name, query in QUERIES.items():
+            print(f"=== {name}\n{query}")  # noqa: T201
+            for use_indexes in (False, True):
+                print(f"\n--- {'with' if use_indexes else 'without'} indexes")  # noqa: T201
+                print(await explain(session, query, use_indexes))  # noqa: T201
+            print()  # noqa: T201
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,24 +1,126 @@
+"""Bulk export and import of the users table with Postgres COPY.
+
+python -m bot.utils.users_export export users.csv.gz
+python -m bot.utils.users_export import users.csv.gz
+
+Files ending with ``.gz`` are gzip compressed, any other file is plain csv with a header row.
+"""
 from __future__ import annotations
-import csv
-import io
+import argparse
+import asyncio
+import gzip
+import tempfile
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
 
-from aiogram.types import BufferedInputFile
-
+from bot.cache.redis import invalidate_tags
 from bot.database.models import UserModel
+from bot.services.users import ALL_USERS_TAG
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from asyncpg import Connection
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+COPY_CHUNK_SIZE = 1024 * 1024
+IMPORT_TABLE = "users_import"
+
+
+def export_filename(compress: bool = True) -> str:
+    extension = "csv.gz" if compress else "csv"
+    return f"users_{datetime.now(timezone.utc).strftime('%Y.%m.%d_%H.%M')}.{extension}"
+
+
+def open_dump(path: Path, mode: str) -> IO[bytes]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode)
+    return path.open(mode)
+
+
+async def get_driver_connection(session: AsyncSession) -> Connection:
+    """The asyncpg connection of the session, for what SQLAlchemy does not wrap (COPY)."""
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    return raw_connection.driver_connection
+
+
+async def export_users(session: AsyncSession, path: Path) -> int:
+    """Dump the users table into ``path`` with COPY TO, return the number of users."""
+    columns = ", ".join(column.name for column in UserModel.__table__.columns)
+    query = f"SELECT {columns} FROM {UserModel.__tablename__} ORDER BY id"  # noqa: S608
+
+    connection = await get_driver_connection(session)
+    with open_dump(path, "wb") as file:
+
+        async def write(chunk: bytes) -> None:
+            # compression is CPU bound, keep it off the event loop
+            await asyncio.to_thread(file.write, chunk)
+
+        status = await connection.copy_from_query(query, output=write, format="csv", header=True)
+
+    return int(status.split()[-1])
+
+
+async def export_users_to_file(session: AsyncSession, compress: bool = True) -> tuple[Path, int]:
+    """Export all users in a temp file, return its path and the number of users. The caller removes the file."""
+    with tempfile.NamedTemporaryFile(suffix=".csv.gz" if compress else ".csv", delete=False) as file:
+        path = Path(file.name)
+
+    try:
+        count = await export_users(session, path)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, count
+
+
+async def import_users(session: AsyncSession, path: Path) -> int:
+    """Load users from a dump made by ``export_users`` with COPY FROM, return the number of new users.
+
+    Rows are copied into a temp table first, so users that already exist are skipped instead of failing the COPY.
+    """
+    columns = [column.name for column in UserModel.__table__.columns]
+    connection = await get_driver_connection(session)
+
+    # the session never began a transaction on this connection, without one the temp table is dropped right away
+    async with connection.transaction():
+        await connection.execute(
+            f"CREATE TEMP TABLE {IMPORT_TABLE} (LIKE {UserModel.__tablename__} INCLUDING DEFAULTS) ON COMMIT DROP",
+        )
+        with open_dump(path, "rb") as file:
+
+            async def read() -> AsyncIterator[bytes]:
+                while chunk := await asyncio.to_thread(file.read, COPY_CHUNK_SIZE):
+                    yield chunk
+
+            await connection.copy_to_table(IMPORT_TABLE, source=read(), columns=columns, format="csv", header=True)
+
+        status = await connection.execute(
+            f"INSERT INTO {UserModel.__tablename__} ({', '.join(columns)}) "  # noqa: S608
+            f"SELECT {', '.join(columns)} FROM {IMPORT_TABLE} ON CONFLICT (id) DO NOTHING",
+        )
+    await invalidate_tags(ALL_USERS_TAG)
+    return int(status.split()[-1])
+
+
+async def main() -> None:
+    from bot.database.database import sessionmaker
 
+    parser = argparse.ArgumentParser(description="Export or import the users table with COPY.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", type=Path, help="csv file, gzip compressed if it ends with .gz")
+    args = parser.parse_args()
 
-async def convert_users_to_csv(users: list[UserModel]) -> BufferedInputFile:
-    """Export all users in csv file."""
-    columns = UserModel.__table__.columns
-    data = [[getattr(user, column.name) for column in columns] for user in users]
+    async with sessionmaker() as session:
+        if args.action == "export":
+            count = await export_users(session, args.path)
+            print(f"exported {count} users to {args.path}")  # noqa: T201
+        else:
+            count = await import_users(session, args.path)
+            print(f"imported {count} new users from {args.path}")  # noqa: T201
 
-    s = io.StringIO()
-    csv.writer(s).writerow(columns)
-    csv.writer(s).writerows(data)
-    s.seek(0)
 
-    return BufferedInputFile(
-        file=s.getvalue().encode("utf-8"),
-        filename=f"users_{datetime.now(timezone.utc).strftime('%Y.%m.%d_%H.%M')}.csv",
-    )
+if __name__ == "__main__":
+    asyncio.run(main())
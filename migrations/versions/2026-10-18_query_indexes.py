@@ -0,0 +1,40 @@
+"""query indexes
+
+Revision ID: c4d81e6f2a95
+Revises: 9b2e64d0c7a1
+Create Date: 2026-10-18 16:41:05.203817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d81e6f2a95'
+down_revision: Union[str, None] = '9b2e64d0c7a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # built concurrently so the bot keeps writing users and match history meanwhile,
+    # which can't happen inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_created_at', 'users', ['created_at'], postgresql_concurrently=True)
+        op.create_index(
+            'ix_games_title_trgm', 'games', ['title'],
+            postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_user_games_user_id_game_id', 'user_games', ['user_id', 'game_id'], postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_games_user_id_game_id', table_name='user_games', postgresql_concurrently=True)
+        op.drop_index('ix_games_title_trgm', table_name='games', postgresql_concurrently=True)
+        op.drop_index('ix_users_created_at', table_name='users', postgresql_concurrently=True)
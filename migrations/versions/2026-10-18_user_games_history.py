@@ -0,0 +1,51 @@
+"""user games history
+
+Revision ID: 9b2e64d0c7a1
+Revises: 3f1c9a7d52e4
+Create Date: 2026-10-18 14:03:12.527361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e64d0c7a1'
+down_revision: Union[str, None] = '3f1c9a7d52e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nothing was ever written to user_games and its keys allowed a single row per user and per game,
+    # so the table is recreated instead of altered
+    op.drop_table('user_games')
+    op.create_table('user_games',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('room_id', sa.String(), nullable=True),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('bet', sa.Float(), nullable=False),
+    sa.Column('opponents', sa.ARRAY(sa.BigInteger()), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text("TIMEZONE('utc', now())"), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_games')
+    op.create_table('user_games',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('game_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('bet', sa.Float(), nullable=False),
+    sa.Column('opponents', sa.ARRAY(sa.Integer()), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'user_id', 'game_id'),
+    sa.UniqueConstraint('game_id'),
+    sa.UniqueConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )